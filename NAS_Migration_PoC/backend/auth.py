@@ -1,5 +1,9 @@
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from typing import Optional
+import os
+import time
+import anyio
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
@@ -11,6 +15,12 @@ SECRET_KEY = "super-secret-key-change-in-production"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
+# bcrypt is deliberately slow (~0.3s); run it off the event loop, a few at a time
+PASSWORD_HASH_CONCURRENCY = 4
+# Verified tokens are trusted for this long (capped by their own expiry) before re-decoding
+TOKEN_CACHE_TTL_SECONDS = 60
+TOKEN_CACHE_SIZE = 1024
+
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
@@ -22,16 +32,79 @@ class User(BaseModel):
     username: str
 
 # Mock Database
+# Hashes are stored, never computed at startup; set NAS_ADMIN_PASSWORD_HASH to override
+# (generate one with: python -c "import bcrypt; print(bcrypt.hashpw(b'pw', bcrypt.gensalt()).decode())")
 FAKE_USERS_DB = {
     "admin": {
         "username": "admin",
-        "hashed_password": pwd_context.hash("secret") # Default password: secret
+        "hashed_password": os.environ.get(
+            "NAS_ADMIN_PASSWORD_HASH",
+            "$2b$12$Yk/VdUFuDQ0IKlV3rWMfaOEBCWxuIELqZRNtm6IdXiSqX1zJ8yP/2"  # Default password: secret
+        )
     }
 }
 
+password_hash_limiter = anyio.CapacityLimiter(PASSWORD_HASH_CONCURRENCY)
+
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
 
+async def verify_password_async(plain_password, hashed_password):
+    """verify_password in a worker thread, so logins never stall WebSocket clients."""
+    return await anyio.to_thread.run_sync(
+        verify_password, plain_password, hashed_password, limiter=password_hash_limiter
+    )
+
+async def hash_password_async(plain_password):
+    return await anyio.to_thread.run_sync(pwd_context.hash, plain_password, limiter=password_hash_limiter)
+
+class TokenCache:
+    """Bounded LRU of verified tokens -> username, each entry expiring after a TTL."""
+
+    def __init__(self, max_size=TOKEN_CACHE_SIZE, ttl=TOKEN_CACHE_TTL_SECONDS):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+
+    def get(self, token):
+        entry = self._entries.get(token)
+        if entry is None:
+            return None
+        username, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._entries[token]
+            return None
+        self._entries.move_to_end(token)
+        return username
+
+    def put(self, token, username, token_exp=None):
+        ttl = self.ttl
+        if token_exp is not None:
+            ttl = min(ttl, token_exp - time.time())
+        if ttl <= 0:
+            return
+        self._entries[token] = (username, time.monotonic() + ttl)
+        self._entries.move_to_end(token)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+token_cache = TokenCache()
+
+def decode_username(token: str) -> Optional[str]:
+    """Username of a valid token for a known user, or None. Verified tokens are cached."""
+    username = token_cache.get(token)
+    if username is None:
+        try:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        except JWTError:
+            return None
+        username = payload.get("sub")
+        if username is None:
+            return None
+        token_cache.put(token, username, payload.get("exp"))
+    # Users removed from the store lose access immediately, cached token or not
+    return username if username in FAKE_USERS_DB else None
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -48,26 +121,11 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
-    except JWTError:
-        raise credentials_exception
-    
-    user_dict = FAKE_USERS_DB.get(username)
-    if user_dict is None:
+    username = decode_username(token)
+    if username is None:
         raise credentials_exception
     return User(username=username)
 
 # WebSocket Auth (Query param alternative)
 async def get_user_from_token(token: str):
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username in FAKE_USERS_DB:
-            return username
-    except:
-        return None
-    return None
+    return decode_username(token)
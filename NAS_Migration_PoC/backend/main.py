@@ -1,4 +1,5 @@
-from fastapi import FastAPI, Depends, WebSocket, WebSocketDisconnect, HTTPException, status
+from fastapi import FastAPI, Depends, WebSocket, WebSocketDisconnect, HTTPException, Request, Response, status
+from fastapi.responses import FileResponse
 from fastapi.security import OAuth2PasswordRequestForm
 from fastapi.middleware.cors import CORSMiddleware
 from typing import List
@@ -6,9 +7,12 @@ import json
 import asyncio
 from pathlib import Path
 from contextlib import asynccontextmanager
+from starlette.concurrency import run_in_threadpool
+import re
 
-from .auth import Token, FAKE_USERS_DB, verify_password, create_access_token, get_current_user, get_user_from_token, ACCESS_TOKEN_EXPIRE_MINUTES
+from .auth import Token, FAKE_USERS_DB, verify_password_async, create_access_token, get_current_user, get_user_from_token, ACCESS_TOKEN_EXPIRE_MINUTES
 from .text_watcher import IndexWatcher
+from .wire import IndexPayloads, MSGPACK_MEDIA_TYPE, choose_encoding, msgpack
 
 import sys
 import os
@@ -19,10 +23,15 @@ from watchdog.events import FileSystemEventHandler
 import subprocess
 import threading
 import time
+from src.snapshot import DirectorySnapshot
+from src.config import RECONCILE_INTERVAL_SECONDS, FILE_CHECK_INTERVAL_SECONDS, SOURCE_CHANGES_PATH
+from src.embeddings import SimilarityIndex
+from src.previews import PreviewCache
 
 # Paths
 BASE_DIR = Path(__file__).resolve().parent.parent
 INDEX_FILE = BASE_DIR / "migration_index.json"
+STATS_FILE = BASE_DIR / "migration_index_stats.json"  # Maintained incrementally by ContentIndexer
 SOURCE_DIR = Path("/Users/ashoks/Downloads") # Hardcoded for PoC
 
 # WebSocket Manager
@@ -46,18 +55,64 @@ class ConnectionManager:
 
 manager = ConnectionManager()
 
+# Index encoded once per format/compression, shared by /documents and the WebSocket
+payloads = IndexPayloads(INDEX_FILE)
+
+# Aggregates served by /stats, re-read only when the index changes
+stats_cache = {}
+# Memory-mapped embeddings behind /documents/{id}/similar, reopened when the index or the embeddings change
+similarity = {"index": None, "version": None, "entries": [], "summaries": {}}
+# id -> (original path, file type) for endpoints that open the source file
+document_sources = {}
+preview_cache = PreviewCache()
+
+def refresh_similarity(documents=None):
+    """Reopen the embeddings; only vectors built from exactly the current index are served."""
+    if documents is not None:
+        similarity["entries"] = documents
+        similarity["summaries"] = {
+            doc["id"]: {key: doc.get(key) for key in ("id", "filename", "category", "subfolder", "file_type")}
+            for doc in documents
+        }
+    index = SimilarityIndex()
+    similarity["version"] = index.version()
+    index = index.load() if index.exists() else None
+    similarity["index"] = index if index is not None and index.matches(similarity["entries"]) else None
+
+def refresh_document_sources(documents):
+    document_sources.clear()
+    document_sources.update({doc["id"]: (doc.get("original_path"), doc.get("file_type")) for doc in documents})
+
+def refresh_stats():
+    try:
+        with open(STATS_FILE, 'r') as f:
+            stats_cache["data"] = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"Could not load stats: {e}")
+
 # Background File Watcher
 index_watcher = None
 source_watcher = None
+reconcile_stop = threading.Event()
 
-def run_extractor():
-    """Runs the main extraction script."""
+def run_extractor(changes=None):
+    """
+    Runs the main extraction script: a full scan, or with `changes` (from the snapshot
+    reconciliation) only those files. Returns True if it finished successfully.
+    """
     print("Change detected! Running extraction...")
+    command = ["python3", str(BASE_DIR / "main.py")]
     # We run main.py as a subprocess to keep it isolated/clean for this PoC
     try:
-        subprocess.run(["python3", str(BASE_DIR / "main.py")], check=True)
+        if changes is not None:
+            with open(SOURCE_CHANGES_PATH, 'w', encoding='utf-8') as f:
+                json.dump(changes, f)
+            command += ["update", "--changes", str(SOURCE_CHANGES_PATH)]
+        subprocess.run(command, check=True)
+        return True
     except Exception as e:
         print(f"Extraction failed: {e}")
+        return False
 
 class SourceHandler(FileSystemEventHandler):
     def __init__(self):
@@ -83,14 +138,55 @@ class SourceHandler(FileSystemEventHandler):
              self.last_run = current_time
              threading.Thread(target=run_extractor).start()
 
+def reconcile_loop(stop_event):
+    """Catch changes the watcher missed (server down, nested folders, in-place edits) via the directory snapshot."""
+    snapshot = DirectorySnapshot(SOURCE_DIR)
+    has_baseline = snapshot.load()
+    last_file_check = None
+    while not stop_event.is_set():
+        try:
+            # In-place edits change only the file's mtime, not its directory's; re-stating every
+            # file costs one stat per file, so that runs at startup and then on a slower cadence
+            check_files = last_file_check is None or time.monotonic() - last_file_check >= FILE_CHECK_INTERVAL_SECONDS
+            changes = snapshot.reconcile(check_files=check_files)
+            total = sum(len(paths) for paths in changes.values())
+            if total:
+                print(f"Reconciliation: {len(changes['added'])} added, {len(changes['deleted'])} deleted, "
+                      f"{len(changes['modified'])} modified")
+            # The first snapshot is only a baseline unless there is no index yet
+            if not INDEX_FILE.exists():
+                ok = run_extractor()
+            elif total and has_baseline:
+                ok = run_extractor(changes)
+            else:
+                ok = True
+            # Only record the changes as seen once they are in the index; otherwise the next pass retries them
+            if ok:
+                snapshot.save()
+                has_baseline = True
+                if check_files:
+                    last_file_check = time.monotonic()
+            else:
+                snapshot = DirectorySnapshot(SOURCE_DIR)
+                has_baseline = snapshot.load()
+        except Exception as e:
+            print(f"Reconciliation failed: {e}")
+            snapshot = DirectorySnapshot(SOURCE_DIR)
+            has_baseline = snapshot.load()
+        stop_event.wait(RECONCILE_INTERVAL_SECONDS)
+
 def on_index_changed():
     """Callback when JSON file changes."""
     print("Detected change in migration_index.json")
+    refresh_stats()
     try:
-        with open(INDEX_FILE, 'r') as f:
-            data = json.load(f)
-        # Broadcast new data to all connected clients
-        asyncio.run(manager.broadcast(json.dumps({"type": "UPDATE", "data": data})))
+        data = payloads.load()
+        refresh_similarity(data)
+        refresh_document_sources(data)
+        # Broadcast new data to all connected clients (compact JSON, encoded once;
+        # the socket itself compresses with permessage-deflate)
+        body, _, _ = payloads.get("json")
+        asyncio.run(manager.broadcast((b'{"type":"UPDATE","data":' + body + b'}').decode("utf-8")))
     except Exception as e:
         print(f"Error broadcasting update: {e}")
 
@@ -103,6 +199,11 @@ async def lifespan(app: FastAPI):
     print(f"Starting Index Watcher for {INDEX_FILE}")
     index_watcher = IndexWatcher(str(INDEX_FILE.parent), str(INDEX_FILE.name), on_index_changed)
     index_watcher.start()
+    refresh_stats()
+    if INDEX_FILE.exists():
+        data = payloads.load()
+        refresh_similarity(data)
+        refresh_document_sources(data)
 
     # 2. Watch for NEW FILES in Downloads (Trigger Extraction)
     # WARNING: Watching entire Downloads folder might be noisy. Restricting to non-hidden.
@@ -112,8 +213,14 @@ async def lifespan(app: FastAPI):
     source_watcher.schedule(event_handler, str(SOURCE_DIR), recursive=False)
     source_watcher.start()
 
+    # 3. Reconcile against the last snapshot now and periodically (missed events)
+    reconcile_stop.clear()
+    threading.Thread(target=reconcile_loop, args=(reconcile_stop,), daemon=True).start()
+
     yield
     # Shutdown
+    reconcile_stop.set()
+    preview_cache.close()
     if index_watcher: index_watcher.stop()
     if source_watcher:
         source_watcher.stop()
@@ -144,19 +251,105 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
     user_dict = FAKE_USERS_DB.get(form_data.username)
     if not user_dict:
         raise HTTPException(status_code=400, detail="Incorrect username or password")
-    if not verify_password(form_data.password, user_dict["hashed_password"]):
+    if not await verify_password_async(form_data.password, user_dict["hashed_password"]):
         raise HTTPException(status_code=400, detail="Incorrect username or password")
     
     access_token = create_access_token(data={"sub": user_dict["username"]})
     return {"access_token": access_token, "token_type": "bearer"}
 
 @app.get("/documents")
-async def get_documents(current_user: str = Depends(get_current_user)):
-    """Secure endpoint to get all documents."""
-    if INDEX_FILE.exists():
-        with open(INDEX_FILE, 'r') as f:
-            return json.load(f)
-    return []
+async def get_documents(request: Request, current_user: str = Depends(get_current_user)):
+    """
+    Secure endpoint to get all documents.
+    JSON by default, key-interned MessagePack for `Accept: application/x-msgpack`;
+    zstd or gzip per Accept-Encoding. Bodies are cached until the index changes.
+    """
+    fmt = "msgpack" if msgpack and MSGPACK_MEDIA_TYPE in request.headers.get("accept", "") else "json"
+    body, etag, encoding = await run_in_threadpool(
+        payloads.get, fmt, choose_encoding(request.headers.get("accept-encoding"))
+    )
+    headers = {"ETag": etag, "Vary": "Accept, Accept-Encoding", "Cache-Control": "private, no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    media_type = MSGPACK_MEDIA_TYPE if fmt == "msgpack" else "application/json"
+    return Response(body, media_type=media_type, headers=headers)
+
+@app.get("/documents/{doc_id}/similar")
+async def get_similar_documents(doc_id: int, k: int = 10, current_user: str = Depends(get_current_user)):
+    """Documents with the most similar content (approximate nearest neighbours)."""
+    # "main.py embed" rewrites the embeddings without touching the index file
+    if SimilarityIndex().version() != similarity["version"]:
+        await run_in_threadpool(refresh_similarity)
+    index = similarity["index"]
+    if index is None:
+        raise HTTPException(status_code=503, detail="Similarity index missing or built from another index (run main.py embed)")
+    if doc_id not in similarity["summaries"]:
+        raise HTTPException(status_code=404, detail="Document not found")
+    neighbours = index.similar(doc_id, k=min(max(k, 1), 100))
+    return [
+        {**similarity["summaries"][other], "score": round(score, 4)}
+        for other, score in neighbours if other in similarity["summaries"]
+    ]
+
+def ranged_file_response(request: Request, path: Path, media_type: str, headers: dict):
+    """FileResponse, or a 206 slice when the client sent a single satisfiable byte range."""
+    size = path.stat().st_size
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if not range_header or (if_range and if_range != headers.get("ETag")):
+        return FileResponse(path, media_type=media_type, headers=headers)
+
+    match = re.fullmatch(r"bytes=(\d*)-(\d*)", range_header.strip())
+    if not match or match.groups() == ("", ""):
+        return Response(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+    start, end = match.groups()
+    if start == "":
+        start, end = max(0, size - int(end)), size - 1  # Suffix range: the last N bytes
+    else:
+        start, end = int(start), min(int(end), size - 1) if end else size - 1
+    if start > end or start >= size:
+        return Response(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+
+    with open(path, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start + 1)
+    return Response(data, status_code=206, media_type=media_type,
+                    headers={**headers, "Content-Range": f"bytes {start}-{end}/{size}"})
+
+@app.get("/documents/{doc_id}/preview")
+async def get_preview(doc_id: int, request: Request, current_user: str = Depends(get_current_user)):
+    """JPEG thumbnail (first PDF page or downscaled image); 202 while it is being rendered."""
+    original_path, file_type = document_sources.get(doc_id, (None, None))
+    if not original_path:
+        raise HTTPException(status_code=404, detail="Document not found")
+    if not PreviewCache.supports(file_type):
+        raise HTTPException(status_code=415, detail="No preview for this file type")
+
+    # Hashing may read the whole file once per version, keep it off the event loop
+    try:
+        key = await run_in_threadpool(preview_cache.content_key, original_path)
+    except OSError:
+        raise HTTPException(status_code=404, detail="Source file not available")
+    headers = {"ETag": f'"{key}"', "Cache-Control": "private, max-age=300", "Accept-Ranges": "bytes"}
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+
+    try:
+        path, key = await run_in_threadpool(preview_cache.get, original_path)
+    except OSError:
+        raise HTTPException(status_code=404, detail="Source file not available")
+    if path is None:
+        if preview_cache.failed(key):
+            raise HTTPException(status_code=422, detail="Preview could not be rendered")
+        return Response(status_code=202, headers={"Retry-After": "1", "Cache-Control": "no-store"})
+    return ranged_file_response(request, path, "image/jpeg", headers)
+
+@app.get("/stats")
+async def get_stats(current_user: str = Depends(get_current_user)):
+    """Category/subfolder counts, histograms and review totals for the current index."""
+    return stats_cache.get("data") or {}
 
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket, token: str):
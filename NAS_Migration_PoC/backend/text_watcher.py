@@ -12,9 +12,16 @@ class ContentFileHandler(FileSystemEventHandler):
         self.last_triggered = 0
 
     def on_modified(self, event):
+        self._handle(event.src_path)
+
+    def on_moved(self, event):
+        # The indexer saves atomically (write temp file, then rename over the index)
+        self._handle(event.dest_path)
+
+    def _handle(self, path):
         # Debounce to avoid double firing
         current_time = time.time()
-        if event.src_path.endswith("migration_index.json") and (current_time - self.last_triggered > 1):
+        if path.endswith("migration_index.json") and (current_time - self.last_triggered > 1):
             logger.info("Content index modified. Triggering update...")
             self.last_triggered = current_time
             self.callback()
@@ -0,0 +1,149 @@
+import gzip
+import json
+import os
+import threading
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+MSGPACK_MEDIA_TYPE = "application/x-msgpack"
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+MIN_COMPRESS_BYTES = 1024  # Smaller bodies are not worth a compression header
+
+
+def dump_json(data):
+    """Compact JSON (no indentation, no spaces after separators)."""
+    return json.dumps(data, separators=(",", ":"), default=str).encode("utf-8")
+
+
+def pack_documents(documents):
+    """
+    MessagePack with key interning: every key is written once in "keys" and each
+    document becomes a positional row, so repeated field names cost nothing.
+    """
+    keys = {}
+    for doc in documents:
+        for key in doc:
+            keys.setdefault(key, None)
+    keys = list(keys)
+    rows = [[doc.get(key) for key in keys] for doc in documents]
+    return msgpack.packb({"keys": keys, "rows": rows}, use_bin_type=True, default=str)
+
+
+def unpack_documents(body):
+    payload = msgpack.unpackb(body, raw=False)
+    keys = payload["keys"]
+    return [dict(zip(keys, row)) for row in payload["rows"]]
+
+
+def choose_encoding(accept_encoding):
+    """
+    The content-coding with the highest q the client accepts; server preference
+    (zstd, gzip, identity) only breaks ties. Identity when nothing usable is acceptable.
+    """
+    accepted = {}
+    for part in (accept_encoding or "").split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        if name:
+            accepted[name.strip().lower()] = q
+
+    preference = (["zstd"] if zstandard is not None else []) + ["gzip"]
+    wildcard = accepted.get("*", 0)
+    q, _, best = max((accepted.get(name, wildcard), -rank, name) for rank, name in enumerate(preference))
+    # Unlisted identity is the fallback, so any accepted coding beats it; a tie goes to compression
+    identity_q = accepted.get("identity", wildcard if "*" in accepted else 0)
+    return best if q > 0 and q >= identity_q else "identity"
+
+
+def compress(body, encoding):
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(body)
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+    return body
+
+
+class IndexPayloads:
+    """
+    The index serialized once per (format, content-coding) and reused until the file's
+    size or mtime changes, so /documents and the WebSocket UPDATE never re-encode per client.
+    """
+
+    def __init__(self, index_file):
+        self.index_file = index_file
+        self.version = None
+        self.documents = []
+        self._variants = {}  # (format, coding) -> (version, body)
+        self._variant_locks = {}
+        self._lock = threading.Lock()  # Guards the fields above; never held while encoding
+
+    def load(self):
+        """Current documents, re-read only if the file changed since the last call."""
+        with self._lock:
+            self._refresh()
+            return self.documents
+
+    def get(self, fmt="json", encoding="identity"):
+        """Returns (body, etag, content-coding actually applied) for the requested variant."""
+        with self._lock:
+            self._refresh()
+            version, documents = self.version, self.documents
+        body = self._encoded(version, documents, fmt, "identity")
+        if encoding == "identity" or len(body) < MIN_COMPRESS_BYTES:
+            return body, self._etag(version, fmt, "identity"), "identity"
+        return self._encoded(version, documents, fmt, encoding), self._etag(version, fmt, encoding), encoding
+
+    def _encoded(self, version, documents, fmt, encoding):
+        """
+        Encode one variant under its own lock: concurrent requests for it wait for a single
+        encode, while other variants and load() carry on.
+        """
+        key = (fmt, encoding)
+        with self._lock:
+            lock = self._variant_locks.setdefault(key, threading.Lock())
+        with lock:
+            with self._lock:
+                cached = self._variants.get(key)
+            if cached and cached[0] == version:
+                return cached[1]
+
+            if encoding != "identity":
+                body = compress(self._encoded(version, documents, fmt, "identity"), encoding)
+            elif fmt == "msgpack":
+                body = pack_documents(documents)
+            else:
+                body = dump_json(documents)
+            with self._lock:
+                if self.version == version:  # Not superseded by a newer index meanwhile
+                    self._variants[key] = (version, body)
+            return body
+
+    @staticmethod
+    def _etag(version, fmt, encoding):
+        return f'"{version[0]:x}-{version[1]:x}-{fmt}-{encoding}"'
+
+    def _refresh(self):
+        try:
+            st = os.stat(self.index_file)
+        except OSError:
+            self.version, self.documents, self._variants = (0, 0), [], {}
+            return
+        version = (st.st_mtime_ns, st.st_size)
+        if version != self.version:
+            with open(self.index_file, 'r', encoding='utf-8') as f:
+                self.documents = json.load(f)
+            self.version = version
+            self._variants = {}
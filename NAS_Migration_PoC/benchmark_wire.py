@@ -0,0 +1,109 @@
+"""
+Bytes on the wire and serialization CPU time for the backend's index payloads.
+Builds a synthetic index shaped like migration_index.json and times each format.
+
+    python benchmark_wire.py --documents 100000
+"""
+import argparse
+import gzip
+import json
+import random
+import time
+import zlib
+
+from backend.wire import dump_json, pack_documents, unpack_documents, compress, zstandard, msgpack, GZIP_LEVEL
+
+WORDS = ("invoice tax return resume experience project report statement account payment "
+         "university course lecture passport identity contract salary python design meeting").split()
+CATEGORIES = ["Academic", "Career", "Identity", "Financial", "Projects", "Miscellaneous"]
+
+
+def synthetic_index(count, seed=1):
+    rng = random.Random(seed)
+    index = []
+    for doc_id in range(1, count + 1):
+        text = " ".join(rng.choice(WORDS) for _ in range(rng.randint(20, 400)))
+        category = rng.choice(CATEGORIES)
+        index.append({
+            "id": doc_id,
+            "filename": f"{rng.choice(WORDS)}_{doc_id}.pdf",
+            "original_path": f"/Users/ashoks/Downloads/{rng.choice(WORDS)}/{rng.choice(WORDS)}_{doc_id}.pdf",
+            "file_type": "pdf",
+            "file_size": rng.randint(1_000, 5_000_000),
+            "file_date": 1.6e9 + rng.random() * 1e8,
+            "category": category,
+            "subfolder": f"{category}/{rng.choice(WORDS).title()}",
+            "confidence": rng.randint(30, 99),
+            "tags": [f"Matched {rng.choice(WORDS)}", "Keyword heuristic"],
+            "extracted_text_preview": text[:200],
+            "full_text": text,
+            "cluster_id": doc_id,
+            "classifier_version": "heuristic-2",
+            "tier": 2,
+        })
+    return index
+
+
+def deflate(body):
+    # What permessage-deflate does to a WebSocket frame (raw deflate, no zlib header)
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, -15)
+    return compressor.compress(body) + compressor.flush()
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--documents", type=int, default=100_000)
+    args = parser.parse_args()
+
+    index = synthetic_index(args.documents)
+    rows = []
+
+    body, ms = timed(lambda d: json.dumps(d, indent=2).encode("utf-8"), index)
+    _, load_ms = timed(json.loads, body)
+    rows.append(("json indent=2 (index file)", len(body), ms, load_ms))
+
+    body, ms = timed(lambda d: json.dumps({"type": "UPDATE", "data": d}).encode("utf-8"), index)
+    _, load_ms = timed(json.loads, body)
+    rows.append(("json default (old WS UPDATE)", len(body), ms, load_ms))
+
+    compact, compact_ms = timed(dump_json, index)
+    _, load_ms = timed(json.loads, compact)
+    rows.append(("json compact", len(compact), compact_ms, load_ms))
+
+    body, ms = timed(deflate, compact)
+    _, inflate_ms = timed(lambda b: zlib.decompressobj(-15).decompress(b), body)
+    rows.append(("json compact + permessage-deflate", len(body), compact_ms + ms, inflate_ms + load_ms))
+
+    body, ms = timed(compress, compact, "gzip")
+    _, gunzip_ms = timed(gzip.decompress, body)
+    rows.append(("json compact + gzip", len(body), compact_ms + ms, gunzip_ms + load_ms))
+
+    if zstandard:
+        body, ms = timed(compress, compact, "zstd")
+        _, unzstd_ms = timed(zstandard.ZstdDecompressor().decompress, body)
+        rows.append(("json compact + zstd", len(body), compact_ms + ms, unzstd_ms + load_ms))
+
+    if msgpack:
+        packed, pack_ms = timed(pack_documents, index)
+        _, unpack_ms = timed(unpack_documents, packed)
+        rows.append(("msgpack interned", len(packed), pack_ms, unpack_ms))
+        if zstandard:
+            body, ms = timed(compress, packed, "zstd")
+            _, unzstd_ms = timed(zstandard.ZstdDecompressor().decompress, body)
+            rows.append(("msgpack interned + zstd", len(body), pack_ms + ms, unzstd_ms + unpack_ms))
+
+    print(f"{args.documents} documents")
+    print(f"{'format':<36}{'bytes':>14}{'encode ms':>12}{'decode ms':>12}")
+    for name, size, encode_ms, decode_ms in rows:
+        print(f"{name:<36}{size:>14,}{encode_ms:>12.0f}{decode_ms:>12.0f}")
+    print("Cached variants are encoded once per index change; later requests only pay for the send.")
+
+
+if __name__ == "__main__":
+    main()
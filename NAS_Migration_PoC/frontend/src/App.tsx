@@ -1,4 +1,4 @@
-import { useState, useEffect } from 'react';
+import { useState, useEffect, useMemo } from 'react';
 import { Login } from './components/Login';
 import { JsonPreviewModal } from './components/JsonPreviewModal';
 import { useWebSocket } from './hooks/useWebSocket';
@@ -13,9 +13,17 @@ interface Document {
   extracted_text_preview: string;
   confidence: number;
   file_type: string;
+  cluster_id?: number | null;
   [key: string]: any; // Allow other fields for JSON view
 }
 
+interface IndexStats {
+  total: number;
+  review_needed: number;
+  categories: Record<string, number>;
+  [key: string]: any;
+}
+
 const CATEGORIES = [
   { id: 'all', label: 'All Files', icon: Home, color: 'text-blue-500' },
   { id: 'Career', label: 'Career', icon: Briefcase, color: 'text-purple-500' },
@@ -31,9 +39,23 @@ function App() {
   const [activeCategory, setActiveCategory] = useState('all');
   const [results, setResults] = useState<Document[]>([]);
   const [selectedDoc, setSelectedDoc] = useState<Document | null>(null);
+  const [stats, setStats] = useState<IndexStats | null>(null);
+
+  // Aggregates are maintained by the indexer, so counts never need a pass over documents
+  const fetchStats = () => {
+    fetch('http://127.0.0.1:8000/stats', {
+      headers: { Authorization: `Bearer ${token}` }
+    })
+      .then(res => res.json())
+      .then(data => setStats(data))
+      .catch(err => console.error(err));
+  };
 
   const { isConnected } = useWebSocket(token, (data) => {
-    if (Array.isArray(data)) setDocuments(data);
+    if (Array.isArray(data)) {
+      setDocuments(data);
+      fetchStats();
+    }
   });
 
   useEffect(() => {
@@ -44,12 +66,29 @@ function App() {
         .then(res => res.json())
         .then(data => setDocuments(data))
         .catch(err => console.error(err));
+      fetchStats();
     }
   }, [token]);
 
+  // Number of near-duplicate versions hidden behind each cluster representative
+  const clusterSizes = useMemo(() => {
+    const sizes: Record<number, number> = {};
+    documents.forEach(d => {
+      if (d.cluster_id != null && d.cluster_id !== d.id) {
+        sizes[d.cluster_id] = (sizes[d.cluster_id] || 0) + 1;
+      }
+    });
+    return sizes;
+  }, [documents]);
+
   useEffect(() => {
     let filtered = documents;
 
+    // Browse one entry per near-duplicate cluster; search still covers every version
+    if (!query) {
+      filtered = filtered.filter(d => d.cluster_id == null || d.cluster_id === d.id);
+    }
+
     if (activeCategory !== 'all') {
       filtered = filtered.filter(d => d.category === activeCategory);
     }
@@ -69,7 +108,9 @@ function App() {
 
   const categoryData = CATEGORIES.map(cat => ({
     ...cat,
-    count: cat.id === 'all' ? documents.length : documents.filter(d => d.category === cat.id).length
+    count: stats
+      ? (cat.id === 'all' ? stats.total : stats.categories?.[cat.id] || 0)
+      : (cat.id === 'all' ? documents.length : documents.filter(d => d.category === cat.id).length)
   }));
 
   return (
@@ -78,6 +119,7 @@ function App() {
       {selectedDoc && (
         <JsonPreviewModal
           document={selectedDoc}
+          token={token}
           onClose={() => setSelectedDoc(null)}
         />
       )}
@@ -191,6 +233,12 @@ function App() {
                         <span className="flex items-center gap-1">
                           {Math.round(doc.confidence)}% match
                         </span>
+                        {clusterSizes[doc.id] > 0 && (
+                          <>
+                            <span className="text-gray-300">•</span>
+                            <span>+{clusterSizes[doc.id]} versions</span>
+                          </>
+                        )}
                       </div>
                     </div>
 
@@ -1,14 +1,54 @@
 import React from 'react';
 import { X, FileJson, Copy, Check } from 'lucide-react';
-import { useState } from 'react';
+import { useState, useEffect } from 'react';
 
 interface JsonPreviewModalProps {
     document: any;
+    token?: string | null;
     onClose: () => void;
 }
 
-export const JsonPreviewModal: React.FC<JsonPreviewModalProps> = ({ document, onClose }) => {
+const PREVIEW_TYPES = ['pdf', 'png', 'jpg', 'jpeg', 'tiff']; // Mirrors the backend's PREVIEW_TYPES
+
+export const JsonPreviewModal: React.FC<JsonPreviewModalProps> = ({ document, token, onClose }) => {
     const [copied, setCopied] = useState(false);
+    const [previewUrl, setPreviewUrl] = useState<string | null>(null);
+
+    // Thumbnails are rendered once on the server; 202 means "still rendering, ask again"
+    useEffect(() => {
+        if (!document || !token || !PREVIEW_TYPES.includes(document.file_type)) return;
+        let cancelled = false;
+        let objectUrl: string | null = null;
+        let timer: ReturnType<typeof setTimeout>;
+
+        const load = (attempt: number) => {
+            fetch(`http://127.0.0.1:8000/documents/${document.id}/preview`, {
+                headers: { Authorization: `Bearer ${token}` }
+            })
+                .then(res => {
+                    if (res.status === 202 && attempt < 20) {
+                        timer = setTimeout(() => load(attempt + 1), 1000);
+                        return null;
+                    }
+                    return res.ok ? res.blob() : null;
+                })
+                .then(blob => {
+                    if (blob && !cancelled) {
+                        objectUrl = URL.createObjectURL(blob);
+                        setPreviewUrl(objectUrl);
+                    }
+                })
+                .catch(err => console.error(err));
+        };
+        load(0);
+
+        return () => {
+            cancelled = true;
+            clearTimeout(timer);
+            if (objectUrl) URL.revokeObjectURL(objectUrl);
+            setPreviewUrl(null);
+        };
+    }, [document, token]);
 
     const handleCopy = () => {
         navigator.clipboard.writeText(JSON.stringify(document, null, 2));
@@ -53,6 +93,13 @@ export const JsonPreviewModal: React.FC<JsonPreviewModalProps> = ({ document, on
 
                 {/* Content */}
                 <div className="flex-1 overflow-auto bg-[#f8f9fa] p-6">
+                    {previewUrl && (
+                        <img
+                            src={previewUrl}
+                            alt={document.filename}
+                            className="max-h-80 mx-auto mb-6 rounded-lg border border-gray-200 shadow-sm bg-white"
+                        />
+                    )}
                     <pre className="font-mono text-sm leading-relaxed text-gray-800 bg-white p-6 rounded-xl border border-gray-200 shadow-sm whitespace-pre-wrap break-words">
                         {JSON.stringify(document, null, 2)}
                     </pre>
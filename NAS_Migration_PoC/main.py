@@ -1,12 +1,27 @@
-from src.config import OLD_NAS_PATH, BASE_DIR
+from src.config import (
+    OLD_NAS_PATH, BASE_DIR, QUARANTINE_PATH, RECLASSIFY_REPORT_PATH, DEEP_PASS_SAVE_SECONDS, DEEP_PASS_SAVE_SHARE,
+    CLUSTER_ADDRESS, CLUSTER_AUTHKEY, EXTRACT_WORKERS, PG_DSN, SOURCE_CHANGES_PATH
+)
 from src.database import DatabaseManager
 from src.scanner import FileScanner
 from src.extractor import ContentExtractor
+from src.supervisor import SupervisedExtractor
+from src.prefetch import Prefetcher
 from src.classifier import DocumentClassifier
 from src.organizer import FileOrganizer
 from src.indexer import ContentIndexer
+from src.near_duplicates import NearDuplicateDetector
+from src.reclassify import Reclassifier
+from src.distributed import plan_shards, ShardCoordinator, ShardWorker
+from src.embeddings import SimilarityIndex
+from src.pg_export import PostgresExporter
 from tqdm import tqdm
+import argparse
+import json
 import logging
+import multiprocessing
+import time
+from pathlib import Path
 
 # Setup Logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -19,35 +34,227 @@ def main():
     scanner = FileScanner(OLD_NAS_PATH)
     extractor = ContentExtractor()
     classifier = DocumentClassifier(use_mock=True)
-    indexer = ContentIndexer(output_path=BASE_DIR / "migration_index.json")
+    indexer = ContentIndexer(output_path=BASE_DIR / "migration_index.json", quarantine_path=QUARANTINE_PATH)
+    duplicates = NearDuplicateDetector()
 
     logger.info("Scanning files...")
     files = list(scanner.scan())
     logger.info(f"Found {len(files)} files.")
 
-    for file_path in tqdm(files, desc="Processing Files"):
+    # Tier 1: stat + filename/extension classification, published within seconds
+    doc_ids = quick_pass(files, extractor, classifier, indexer)
+    saved_path = indexer.save()
+    logger.info(f"Tier-1 index with {len(doc_ids)} files published to: {saved_path}")
+
+    # Tier 2: deep extraction, most valuable (least certain) files first, upgrading entries in place
+    deep_pass(doc_ids, classifier, indexer, duplicates)
+
+    # Group near-identical versions so the AI step only sees one per cluster
+    indexer.assign_clusters(duplicates.clusters())
+    duplicates.save(indexer.index)
+
+    # Embeddings for "find related documents", ready before the index that they describe is published
+    SimilarityIndex().build(indexer.index)
+
+    # Save the master index
+    saved_path = indexer.save()
+    logger.info(f"Migration Index saved to: {saved_path}")
+
+def update(changes_path=SOURCE_CHANGES_PATH):
+    """
+    Apply a snapshot reconciliation ({"added", "deleted", "modified"} paths) to the saved index.
+    Only the changed files are read, extracted, MinHashed and embedded; everything else reuses
+    the saved signatures and vectors.
+    """
+    indexer = ContentIndexer(output_path=BASE_DIR / "migration_index.json", quarantine_path=QUARANTINE_PATH)
+    if not indexer.output_path.exists():
+        logger.info("No index yet, running a full scan.")
+        return main()
+    with open(changes_path, 'r', encoding='utf-8') as f:
+        changes = json.load(f)
+    indexer.load()
+    if QUARANTINE_PATH.exists():
+        with open(QUARANTINE_PATH, 'r', encoding='utf-8') as f:
+            indexer.quarantined = json.load(f)
+
+    # Rows of the published embeddings, taken before remove_documents() renumbers the ids
+    previous_rows = {entry["original_path"]: entry["id"] - 1 for entry in indexer.index}
+
+    # A modified file is re-indexed from scratch: dropped here, added again below
+    # (as is an added file that is indexed already, e.g. from a change list applied twice)
+    stale = set(changes["deleted"]) | set(changes["modified"]) | (set(changes["added"]) & previous_rows.keys())
+    removed = indexer.remove_documents(stale)
+    indexer.quarantined = [q for q in indexer.quarantined if q["original_path"] not in stale]
+    files = [Path(path) for path in changes["added"] + changes["modified"]]
+    logger.info(f"Updating index: {removed} entries removed, {len(files)} files to extract.")
+
+    extractor = ContentExtractor()
+    classifier = DocumentClassifier(use_mock=True)
+    duplicates = NearDuplicateDetector()
+    reused = duplicates.restore(indexer.index)
+    logger.info(f"Reused {reused} of {len(indexer.index)} MinHash signatures.")
+
+    doc_ids = quick_pass(files, extractor, classifier, indexer)
+    deep_pass(doc_ids, classifier, indexer, duplicates)
+    indexer.assign_clusters(duplicates.clusters())
+    duplicates.save(indexer.index)
+
+    SimilarityIndex().update(indexer.index, previous_rows, {str(path) for path in files})
+    saved_path = indexer.save()
+    logger.info(f"Migration Index updated at: {saved_path}")
+
+def quick_pass(files, extractor, classifier, indexer):
+    """Index every file from metadata alone. Returns {file path: doc id}."""
+    doc_ids = {}
+    for file_path in tqdm(files, desc="Quick Pass"):
         try:
-            # 1. Extract (Deep content read)
-            text, metadata = extractor.extract(file_path)
-            
-            # 2. Classify (Based on content)
-            classification = classifier.classify(text, metadata)
-            
-            # 3. Add to Search Index (Primary Goal)
+            metadata = extractor.describe(file_path)
+            classification = classifier.classify("", metadata)
             doc_data = metadata.copy()
             doc_data['original_file_path'] = str(file_path)
-            doc_data['extracted_text'] = text
-            indexer.add_document(doc_data, classification)
-            
-            # 4. (Optional) DB Logging for Audit
-            # We skip full DB insert to speed up for this new 'Indexer' mode, or just log basic status
-            
+            doc_data['extracted_text'] = ""
+            doc_ids[str(file_path)] = indexer.add_document(doc_data, classification, tier=1)
         except Exception as e:
-            logger.error(f"Error processing {file_path}: {e}")
+            logger.error(f"Error indexing {file_path}: {e}")
+    return doc_ids
 
-    # Save the master index
+def deep_pass(doc_ids, classifier, indexer, duplicates):
+    """Run full extraction, lowest-confidence then smallest files first, saving periodically."""
+    def expected_value(path):
+        entry = indexer.index[doc_ids[path] - 1]
+        return (entry.get("confidence") or 0, entry.get("file_size") or 0)
+
+    ordered = sorted(doc_ids, key=expected_value)
+    last_save = time.monotonic()
+    save_interval = DEEP_PASS_SAVE_SECONDS
+
+    # 1. Extract (Deep content read) in supervised workers with per-file limits,
+    #    fed from a read-ahead stage so NAS latency overlaps with parsing/OCR
+    with SupervisedExtractor() as extractor:
+        results = extractor.imap(ordered, prefetcher=Prefetcher())
+        for file_path, text, metadata, signature, reason in tqdm(results, total=len(ordered), desc="Deep Pass"):
+            if reason:
+                indexer.add_quarantined(file_path, reason)
+                continue
+            process_document(doc_ids[str(file_path)], file_path, text, metadata, signature,
+                             classifier, indexer, duplicates)
+
+            if time.monotonic() - last_save > save_interval:
+                started = time.monotonic()
+                indexer.save()
+                last_save = time.monotonic()
+                # A save rewrites the whole index, so space saves out as it grows
+                save_interval = max(DEEP_PASS_SAVE_SECONDS, (last_save - started) / DEEP_PASS_SAVE_SHARE)
+
+def process_document(doc_id, file_path, text, metadata, signature, classifier, indexer, duplicates):
+    """Classify an extracted file and upgrade its index entry (signature: MinHash from the worker)."""
+    try:
+        # 2. Classify (Based on content)
+        classification = classifier.classify(text, metadata)
+        
+        # 3. Add to Search Index (Primary Goal)
+        doc_data = metadata.copy()
+        doc_data['original_file_path'] = str(file_path)
+        doc_data['extracted_text'] = text
+        indexer.update_document(doc_id, doc_data, classification, tier=2)
+        duplicates.add_signature(doc_id, signature)
+        
+        # 4. (Optional) DB Logging for Audit
+        # We skip full DB insert to speed up for this new 'Indexer' mode, or just log basic status
+        
+    except Exception as e:
+        logger.error(f"Error processing {file_path}: {e}")
+
+def reclassify(force=False):
+    """Re-run the classifier over text already in the index (no extraction)."""
+    logger.info("Reclassifying from cached text...")
+    indexer = ContentIndexer(output_path=BASE_DIR / "migration_index.json")
+    report = Reclassifier(indexer).run(force=force)
+    Reclassifier.save_report(report, RECLASSIFY_REPORT_PATH)
+    for change in report[:20]:
+        before, after = change["before"], change["after"]
+        logger.info(f"  {change['filename']}: {before['category']}/{before['subfolder']} -> {after['category']}/{after['subfolder']}")
+    logger.info(f"{len(report)} classifications changed, diff report saved to {RECLASSIFY_REPORT_PATH}")
+
+def embed():
+    """Rebuild the similarity index from text already in the saved index."""
+    indexer = ContentIndexer(output_path=BASE_DIR / "migration_index.json")
+    SimilarityIndex().build(indexer.load())
+
+def export_pg(dsn, prune=False):
+    """Bulk-load the saved index into PostgreSQL (COPY into staging, upsert, then build indexes)."""
+    indexer = ContentIndexer(output_path=BASE_DIR / "migration_index.json")
+    entries = indexer.load()
+    started = time.monotonic()
+    loaded = PostgresExporter(dsn).export(entries, prune=prune)
+    logger.info(f"Exported {loaded} entries to PostgreSQL in {time.monotonic() - started:.1f}s")
+
+def coordinate(address, local_workers=0, procs=EXTRACT_WORKERS):
+    """Shard the source tree, lease shards to workers as they are planned and merge their segments into one index."""
+    # Shards are leased while the tree is still being walked
+    coordinator = ShardCoordinator(plan_shards(FileScanner(OLD_NAS_PATH)), address, CLUSTER_AUTHKEY)
+
+    # Local workers make a single machine behave like a small cluster (and are handy for testing)
+    ctx = multiprocessing.get_context("spawn")
+    local = [ctx.Process(target=run_worker, args=(address, procs)) for _ in range(local_workers)]
+    for process in local:
+        process.start()
+    try:
+        coordinator.serve()
+        for process in local:
+            process.join()
+    finally:
+        coordinator.close()
+
+    # Near-duplicates can straddle shards, so cluster over the merged index
+    # (workers shipped the signatures; only the LSH bucketing happens here)
+    indexer = ContentIndexer(output_path=BASE_DIR / "migration_index.json", quarantine_path=QUARANTINE_PATH)
+    duplicates = NearDuplicateDetector()
+    coordinator.merge(indexer, duplicates)
+    indexer.assign_clusters(duplicates.clusters())
+    duplicates.save(indexer.index)
+
+    SimilarityIndex().build(indexer.index)
     saved_path = indexer.save()
-    logger.info(f"Migration Index saved to: {saved_path}")
+    logger.info(f"Merged index saved to: {saved_path}")
+
+def run_worker(address, procs=EXTRACT_WORKERS):
+    """Lease and process shards until the coordinator has none left."""
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    ShardWorker(address, CLUSTER_AUTHKEY, procs=procs).run()
+
+def parse_address(value):
+    host, _, port = value.rpartition(":")
+    return (host or CLUSTER_ADDRESS[0], int(port))
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="NAS Migration System PoC")
+    parser.add_argument("mode", nargs="?", default="scan", choices=["scan", "update", "reclassify", "embed", "export-pg", "coordinator", "worker"],
+                        help="scan: extract + classify the source tree; update: apply the changes in --changes to the saved index; reclassify: re-run the classifier on the saved index; "
+                             "embed: rebuild the similarity index; export-pg: load the saved index into PostgreSQL; "
+                             "coordinator/worker: the same scan sharded across worker nodes")
+    parser.add_argument("--changes", type=Path, default=SOURCE_CHANGES_PATH,
+                        help="update: JSON file with the added/deleted/modified paths from the snapshot reconciliation")
+    parser.add_argument("--force", action="store_true", help="reclassify: include entries already at the current classifier version")
+    parser.add_argument("--address", type=parse_address, default=CLUSTER_ADDRESS,
+                        help="coordinator/worker: host:port the coordinator listens on (authkey from NAS_CLUSTER_AUTHKEY)")
+    parser.add_argument("--local-workers", type=int, default=0, help="coordinator: also start this many workers on this machine")
+    parser.add_argument("--procs", type=int, default=EXTRACT_WORKERS, help="coordinator/worker: extraction processes per worker")
+    parser.add_argument("--dsn", default=PG_DSN, help="export-pg: PostgreSQL connection string (default from NAS_PG_DSN)")
+    parser.add_argument("--prune", action="store_true", help="export-pg: delete rows for files no longer in the index")
+    args = parser.parse_args()
+
+    if args.mode == "update":
+        update(args.changes)
+    elif args.mode == "reclassify":
+        reclassify(force=args.force)
+    elif args.mode == "embed":
+        embed()
+    elif args.mode == "export-pg":
+        export_pg(args.dsn, prune=args.prune)
+    elif args.mode == "coordinator":
+        coordinate(args.address, local_workers=args.local_workers, procs=args.procs)
+    elif args.mode == "worker":
+        run_worker(args.address, procs=args.procs)
+    else:
+        main()
@@ -1,7 +1,12 @@
 import json
 import random
 
+from src.config import CLASSIFIER_MAX_CHARS
+
 class DocumentClassifier:
+    # Bump whenever the heuristic rules change so `main.py reclassify` picks documents up again
+    VERSION = "heuristic-2"
+
     def __init__(self, use_mock=True):
         self.use_mock = use_mock
 
@@ -15,10 +20,13 @@ class DocumentClassifier:
         
     def _heuristic_classify(self, text, metadata):
         """Content-based heuristic classification."""
-        # Use full extracted text + filename
-        text_lower = text.lower()
+        # Use the bounded text window + filename (one lowercased copy, no concatenation)
+        window = text if len(text) <= CLASSIFIER_MAX_CHARS else text[:CLASSIFIER_MAX_CHARS]
+        text_lower = window.lower()
         filename_lower = metadata['filename'].lower()
-        combined_text = f"{filename_lower} \n {text_lower}"
+
+        def mentions(*keywords):
+            return any(kw in filename_lower or kw in text_lower for kw in keywords)
         
         # Default
         category = "Miscellaneous"
@@ -45,31 +53,31 @@ class DocumentClassifier:
             confidence = 90
             
         # Academic: Assignments, transcripts, courses
-        elif "assignment" in combined_text or "homework" in combined_text or \
+        elif mentions("assignment", "homework") or \
              ("professor" in text_lower and "semester" in text_lower) or \
-             "transcript" in combined_text or "university of" in text_lower:
+             mentions("transcript") or "university of" in text_lower:
             category = "Academic"
-            if "assignment" in combined_text: subfolder = "Assignments"
-            elif "lecture" in combined_text or "slides" in text_lower: subfolder = "Lectures"
-            elif "sop" in combined_text or "statement of purpose" in text_lower: subfolder = "SOPs"
+            if mentions("assignment"): subfolder = "Assignments"
+            elif mentions("lecture") or "slides" in text_lower: subfolder = "Lectures"
+            elif mentions("sop") or "statement of purpose" in text_lower: subfolder = "SOPs"
             else: subfolder = "General"
             confidence = 85
 
         # Identity: Official IDs, Passports
-        elif any(kw in combined_text for kw in ["passport", "visa", "driving license", "aadhaar", "ssn", "social security"]):
+        elif mentions("passport", "visa", "driving license", "aadhaar", "ssn", "social security"):
             category = "Identity"
             subfolder = detected_name
             confidence = 95
             
         # Financial: Receipts, Taxes
-        elif any(kw in combined_text for kw in ["tax returns", "w2", "1099", "invoice", "receipt", "payment success", "transaction id", "billing"]):
+        elif mentions("tax returns", "w2", "1099", "invoice", "receipt", "payment success", "transaction id", "billing"):
             category = "Financial"
             subfolder = "Receipts_Invoices"
             confidence = 88
             
         # Projects: Code identifiers
         elif metadata["file_type"] in ["py", "js", "ts", "html", "css", "sql", "json", "java", "cpp", "c"] or \
-             "def " in text or "function" in text or "import " in text or "select * from" in text_lower:
+             "def " in window or "function" in window or "import " in window or "select * from" in text_lower:
             category = "Projects"
             subfolder = "Code_Assets"
             confidence = 90
@@ -80,5 +88,6 @@ class DocumentClassifier:
             "document_type": "Unknown",
             "extracted_text": text, # Pass full text for indexing
             "confidence_score": confidence,
-            "reasoning": f"Content match. Name detected: {detected_name}"
+            "reasoning": f"Content match. Name detected: {detected_name}",
+            "classifier_version": self.VERSION
         }
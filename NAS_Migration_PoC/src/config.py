@@ -23,6 +23,89 @@ BATCH_SIZE = 10
 CONFIDENCE_THRESHOLD_AUTO_FILE = 85
 CONFIDENCE_THRESHOLD_REVIEW = 60
 
+# Extraction Isolation (per-file limits for supervised workers)
+EXTRACT_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+EXTRACT_TIMEOUT_SECONDS = 120
+EXTRACT_MEMORY_LIMIT_MB = 2048  # Enforced with RLIMIT_AS on Linux only
+QUARANTINE_PATH = BASE_DIR / "quarantine.json"
+DEEP_PASS_SAVE_SECONDS = 30  # How often the deep pass republishes upgraded entries (at least)
+DEEP_PASS_SAVE_SHARE = 0.05  # ...stretched so saving the index takes at most this share of the pass
+
+# Distributed Scan (one coordinator leasing shards to worker nodes)
+CLUSTER_ADDRESS = (os.environ.get("NAS_CLUSTER_HOST", "127.0.0.1"), int(os.environ.get("NAS_CLUSTER_PORT", "6010")))
+CLUSTER_AUTHKEY = os.environ.get("NAS_CLUSTER_AUTHKEY", "").encode("utf-8")  # Required off loopback
+SHARD_MAX_FILES = 2000
+LEASE_SECONDS = 300  # Must outlast EXTRACT_TIMEOUT_SECONDS between heartbeats
+HEARTBEAT_SECONDS = 30
+SEGMENT_DIR = BASE_DIR / "segments"
+
+# Source Tree Snapshot (reconciles changes the file watcher missed)
+SNAPSHOT_PATH = BASE_DIR / "source_snapshot.json"
+RECONCILE_INTERVAL_SECONDS = 300  # Directory mtimes only: catches adds, deletes and renames
+FILE_CHECK_INTERVAL_SECONDS = 6 * 3600  # Every file stat()ed too: catches in-place edits
+SOURCE_CHANGES_PATH = BASE_DIR / "source_changes.json"  # Paths handed from the backend to "main.py update"
+
+# Read-ahead I/O (hides NAS round-trips behind extraction)
+PREFETCH_CONCURRENCY = 16
+PREFETCH_MEMORY_BYTES = 512 * 1024 * 1024
+PREFETCH_MAX_FILE_BYTES = 64 * 1024 * 1024  # Larger files are read directly by the extractor
+
+# Text Handling (bounded window kept from large text/code files)
+TEXT_READ_CHUNK_BYTES = 64 * 1024
+TEXT_HEAD_BYTES = 256 * 1024
+TEXT_TAIL_BYTES = 32 * 1024
+CLASSIFIER_MAX_CHARS = TEXT_HEAD_BYTES + TEXT_TAIL_BYTES
+
+# Re-classification from cached text
+RECLASSIFY_BATCH_SIZE = 500
+RECLASSIFY_REPORT_PATH = BASE_DIR / "reclassify_report.json"
+
+# Near-Duplicate Detection (MinHash/LSH over extracted text)
+MINHASH_PERMUTATIONS = 64
+MINHASH_BANDS = 16  # 16 bands x 4 rows: candidate pairs from ~0.5 similarity
+SHINGLE_WORDS = 5
+SHINGLE_SAMPLE_MOD = 4  # Keep shingles whose hash is divisible by this
+NEAR_DUPLICATE_MIN_SHINGLES = 8
+NEAR_DUPLICATE_THRESHOLD = 0.8
+MINHASH_PATH = BASE_DIR / "minhash_signatures.npz"  # Per-file signatures reused by "main.py update"
+
+# Similarity Index (hashed text embeddings + IVF approximate nearest neighbours)
+EMBEDDING_DIM = 256
+EMBEDDINGS_PATH = BASE_DIR / "embeddings"  # embeddings.npy (float32 memmap) + embeddings_ivf.npz
+IVF_TRAIN_SAMPLE = 20000  # Rows k-means is trained on
+IVF_KMEANS_ITERATIONS = 10
+IVF_NPROBE = 8  # Lists scanned per query
+RELATED_THRESHOLD = 0.5  # Cosine score for "related" grouping hints in the AI prompt
+RELATED_NEIGHBOURS = 5
+EMBEDDING_REBUILD_SHARE = 0.2  # An update changing more rows than this retrains IDF and IVF from scratch
+
+# Preview Thumbnails (rendered once per file content, LRU-bounded on disk)
+PREVIEW_CACHE_DIR = BASE_DIR / "preview_cache"
+PREVIEW_CACHE_BYTES = 1024 * 1024 * 1024
+PREVIEW_MAX_PX = 512
+PREVIEW_WORKERS = 2
+PREVIEW_TIMEOUT_SECONDS = 30
+PREVIEW_MEMORY_LIMIT_MB = 1024  # Enforced with RLIMIT_AS on Linux only
+PREVIEW_MEMO_ENTRIES = 100000  # Content hashes and failed renders remembered (LRU each)
+
+# AI Prompt Budget (per Gemini call; the file_mapping answer grows with the inventory too)
+PROMPT_TOKEN_BUDGET = 32000
+PROMPT_OUTPUT_TOKEN_BUDGET = 16000  # Estimated answer size per call, well under the model's output limit
+PROMPT_MAPPING_TOKENS = 15  # Answer overhead per listed entry: quotes, target folder, separators
+PROMPT_CHARS_PER_TOKEN = 4
+PROMPT_SEQUENCE_MIN = 3  # Numbered runs this long collapse to one "first..last" line
+
+# Applying the AI organization
+MOVE_WORKERS = 8
+MOVE_JOURNAL_PATH = BASE_DIR / "move_journal.jsonl"
+JOURNAL_SYNC_EVERY = 256  # Records buffered per fsync
+
+# PostgreSQL Export (shared store for many backend workers)
+PG_DSN = os.environ.get("NAS_PG_DSN", "dbname=nas_migration")
+PG_TABLE = "indexed_documents"
+PG_COPY_BATCH_ROWS = 50000
+PG_MAINTENANCE_WORK_MEM = "1GB"  # For the GIN build after loading
+
 # Services (Categories for Personal Files)
 SERVICES = [
     "Academic",
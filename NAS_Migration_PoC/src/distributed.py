@@ -0,0 +1,313 @@
+import ipaddress
+import json
+import logging
+import os
+import shutil
+import socket
+import threading
+import time
+from collections import deque
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Listener, Client
+from pathlib import Path
+
+from src.classifier import DocumentClassifier
+from src.config import SHARD_MAX_FILES, LEASE_SECONDS, HEARTBEAT_SECONDS, SEGMENT_DIR, EXTRACT_WORKERS
+from src.indexer import ContentIndexer
+from src.prefetch import Prefetcher
+from src.supervisor import SupervisedExtractor
+
+logger = logging.getLogger(__name__)
+
+# Used only on loopback when NAS_CLUSTER_AUTHKEY is not set
+LOCAL_AUTHKEY = b"nas-migration-local"
+
+
+def cluster_authkey(address, authkey):
+    """
+    The key to listen or connect with. multiprocessing connections unpickle whatever the
+    peer sends, so a well-known key is only acceptable when nobody else can reach the port.
+    """
+    if authkey:
+        return authkey
+    host = address[0] or "0.0.0.0"
+    try:
+        loopback = ipaddress.ip_address(socket.gethostbyname(host)).is_loopback
+    except (OSError, ValueError):
+        loopback = False
+    if not loopback:
+        raise ValueError(f"Set NAS_CLUSTER_AUTHKEY to use the non-loopback cluster address {host}")
+    return LOCAL_AUTHKEY
+
+
+def plan_shards(scanner):
+    """
+    Partition the tree into shards of up to SHARD_MAX_FILES files in walk order, so files
+    stay grouped with their directory and one huge folder can span several shards.
+    Only directory listings are read; sizes are left to the workers' own stat() calls.
+    Yields each shard as soon as it is full, so workers can start before the walk ends.
+    """
+    current = []
+    for file_path in scanner.scan():
+        current.append(str(file_path))
+        if len(current) >= SHARD_MAX_FILES:
+            yield current
+            current = []
+    if current:
+        yield current
+
+
+class ShardCoordinator:
+    """
+    Leases shards to workers over authenticated multiprocessing connections.
+    It listens from construction on and leases shards while they are still being planned.
+    Workers keep their lease alive with heartbeats; a lease that expires (or whose
+    worker disconnects) goes back to the queue. Each finished shard is written as an
+    index segment (entries plus their MinHash signatures), and the segments are merged
+    into the final index at the end.
+    """
+
+    def __init__(self, shards, address, authkey, segment_dir=SEGMENT_DIR, lease_seconds=LEASE_SECONDS):
+        self.planner = iter(shards)
+        self.shards = []
+        self.address = address
+        self.authkey = cluster_authkey(address, authkey)
+        self.segment_dir = Path(segment_dir)
+        self.lease_seconds = lease_seconds
+        self.pending = deque()
+        self.leases = {}  # shard_id -> (worker_id, deadline)
+        self.completed = set()
+        self.lock = threading.Lock()
+        self.planned = threading.Event()
+        self.finished = threading.Event()
+        self.listener = Listener(address, authkey=self.authkey)
+        logger.info(f"Coordinator listening on {self.listener.address}")
+
+    def serve(self):
+        """Plan the shards, leasing each as it comes, and block until every one has a segment on disk."""
+        if self.segment_dir.exists():
+            shutil.rmtree(self.segment_dir)
+        self.segment_dir.mkdir(parents=True)
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+
+        for shard in self.planner:
+            with self.lock:
+                self.shards.append(shard)
+                self.pending.append(len(self.shards) - 1)
+            self._expire_leases()
+        with self.lock:
+            self.planned.set()
+            if len(self.completed) == len(self.shards):
+                self.finished.set()
+        logger.info(f"{sum(len(s) for s in self.shards)} files in {len(self.shards)} shards")
+
+        while not self.finished.wait(timeout=1):
+            self._expire_leases()
+
+    def close(self):
+        """Stop accepting workers; until then, late ones are told there is nothing left."""
+        self.listener.close()
+
+    def merge(self, indexer, duplicates=None):
+        """Merge all segments, in shard order, into the given indexer (and their signatures into duplicates)."""
+        for shard_id in range(len(self.shards)):
+            with open(self._segment_path(shard_id), 'r', encoding='utf-8') as f:
+                segment = json.load(f)
+            indexer.merge_segment(segment["index"], segment["quarantined"])
+            if duplicates is not None:
+                # merge_segment renumbered the entries in place
+                for entry, sig in zip(segment["index"], segment["signatures"]):
+                    duplicates.add_signature(entry["id"], sig)
+        return indexer
+
+    def _segment_path(self, shard_id):
+        return self.segment_dir / f"shard_{shard_id:05d}.json"
+
+    def _accept_loop(self):
+        while True:
+            try:
+                conn = self.listener.accept()
+            except (AuthenticationError, EOFError, ConnectionError):
+                continue  # One bad handshake (wrong key, port scan)
+            except OSError:
+                break  # close()d
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def _handle(self, conn):
+        worker_id, holds_leases = None, False
+        try:
+            while True:
+                message = conn.recv()
+                kind, worker_id = message[0], message[1]
+                if kind == "lease":
+                    holds_leases = True
+                    conn.send(self._lease(worker_id))
+                elif kind == "heartbeat":
+                    conn.send(("ok",) if self._renew(worker_id, message[2]) else ("lost",))
+                elif kind == "segment":
+                    _, _, shard_id, index, quarantined, signatures = message
+                    self._complete(worker_id, shard_id, index, quarantined, signatures)
+                    conn.send(("ok",))
+        except (EOFError, OSError):
+            pass
+        finally:
+            conn.close()
+            # A dropped lease connection hands its shards straight back (heartbeat ones do not)
+            if holds_leases:
+                self._release_worker(worker_id)
+
+    def _lease(self, worker_id):
+        with self.lock:
+            if self.finished.is_set():
+                return ("done",)
+            while self.pending and self.pending[0] in self.completed:
+                self.pending.popleft()
+            if not self.pending:
+                # Still planning: the next shard is usually a few directory listings away
+                return ("wait", HEARTBEAT_SECONDS if self.planned.is_set() else 1)
+            shard_id = self.pending.popleft()
+            self.leases[shard_id] = (worker_id, time.monotonic() + self.lease_seconds)
+        logger.info(f"Leased shard {shard_id} ({len(self.shards[shard_id])} files) to {worker_id}")
+        return ("shard", shard_id, self.shards[shard_id])
+
+    def _renew(self, worker_id, shard_id):
+        with self.lock:
+            lease = self.leases.get(shard_id)
+            if not lease or lease[0] != worker_id:
+                return False
+            self.leases[shard_id] = (worker_id, time.monotonic() + self.lease_seconds)
+            return True
+
+    def _complete(self, worker_id, shard_id, index, quarantined, signatures):
+        with self.lock:
+            if shard_id in self.completed:
+                return  # A re-leased copy already finished
+        tmp_path = self._segment_path(shard_id).with_suffix(".tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"worker": worker_id, "index": index, "quarantined": quarantined, "signatures": signatures},
+                      f, default=str)
+        with self.lock:
+            if shard_id in self.completed:
+                tmp_path.unlink()
+                return
+            os.replace(tmp_path, self._segment_path(shard_id))
+            self.completed.add(shard_id)
+            self.leases.pop(shard_id, None)
+            logger.info(f"Shard {shard_id} done by {worker_id} ({len(self.completed)}/{len(self.shards)})")
+            if self.planned.is_set() and len(self.completed) == len(self.shards):
+                self.finished.set()
+
+    def _release_worker(self, worker_id):
+        with self.lock:
+            for shard_id, (holder, _) in list(self.leases.items()):
+                if holder == worker_id:
+                    del self.leases[shard_id]
+                    self.pending.append(shard_id)
+                    logger.warning(f"Worker {worker_id} disconnected, re-queued shard {shard_id}")
+
+    def _expire_leases(self):
+        now = time.monotonic()
+        with self.lock:
+            for shard_id, (worker_id, deadline) in list(self.leases.items()):
+                if deadline < now:
+                    del self.leases[shard_id]
+                    self.pending.append(shard_id)
+                    logger.warning(f"Lease on shard {shard_id} held by {worker_id} expired, re-queued")
+
+
+class ShardWorker:
+    """
+    Leases shards from a coordinator and turns each into an index segment, including the
+    MinHash signatures so the coordinator only has to bucket them.
+    Shard paths are absolute, so every worker host must mount the share at the same path.
+    """
+
+    def __init__(self, address, authkey, procs=EXTRACT_WORKERS, worker_id=None):
+        self.address = address
+        self.authkey = cluster_authkey(address, authkey)
+        self.procs = procs
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.classifier = DocumentClassifier(use_mock=True)
+
+    def run(self):
+        try:
+            conn = self._connect()
+        except AuthenticationError as e:
+            logger.error(f"Coordinator at {self.address} rejected this worker ({e}); check NAS_CLUSTER_AUTHKEY")
+            return
+        try:
+            with SupervisedExtractor(workers=self.procs) as extractor:
+                while True:
+                    conn.send(("lease", self.worker_id))
+                    reply = conn.recv()
+                    if reply[0] == "done":
+                        break
+                    if reply[0] == "wait":
+                        time.sleep(reply[1])
+                        continue
+                    _, shard_id, paths = reply
+                    result = self._process(extractor, shard_id, paths)
+                    if result is not None:
+                        segment, signatures = result
+                        conn.send(("segment", self.worker_id, shard_id, segment.index, segment.quarantined,
+                                   signatures))
+                        conn.recv()
+        except (EOFError, ConnectionError):
+            logger.info("Coordinator went away, stopping")
+        finally:
+            conn.close()
+
+    def _connect(self):
+        """Connect to the coordinator, waiting (with backoff, for as long as it takes) for it to come up."""
+        delay = 1
+        while True:
+            try:
+                return Client(self.address, authkey=self.authkey)
+            except (OSError, EOFError) as e:
+                logger.warning(f"Coordinator at {self.address} not reachable ({e}), retrying in {delay}s")
+                time.sleep(delay)
+                delay = min(delay * 2, HEARTBEAT_SECONDS)
+
+    def _process(self, extractor, shard_id, paths):
+        """Extract + classify one shard. Returns (segment, signatures), or None if the lease was lost midway."""
+        lost = threading.Event()
+        stop = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(shard_id, stop, lost), daemon=True)
+        heartbeat.start()
+
+        segment = ContentIndexer(output_path=os.devnull)
+        signatures = []  # One per segment entry, in entry order
+        try:
+            for file_path, text, metadata, signature, reason in extractor.imap(paths, prefetcher=Prefetcher()):
+                if lost.is_set():
+                    logger.warning(f"Lost lease on shard {shard_id}, abandoning it")
+                    return None
+                if reason:
+                    segment.add_quarantined(file_path, reason)
+                    continue
+                classification = self.classifier.classify(text, metadata)
+                doc_data = metadata.copy()
+                doc_data['original_file_path'] = str(file_path)
+                doc_data['extracted_text'] = text
+                segment.add_document(doc_data, classification)
+                signatures.append(signature)
+        finally:
+            stop.set()
+        return segment, signatures
+
+    def _heartbeat(self, shard_id, stop, lost):
+        # Own connection, so heartbeats flow while the main one waits on extraction
+        try:
+            conn = Client(self.address, authkey=self.authkey)
+        except (OSError, EOFError, AuthenticationError):
+            return
+        try:
+            while not stop.wait(HEARTBEAT_SECONDS):
+                conn.send(("heartbeat", self.worker_id, shard_id))
+                if conn.recv()[0] == "lost":
+                    lost.set()
+                    break
+        except (EOFError, OSError):
+            pass
+        finally:
+            conn.close()
@@ -0,0 +1,268 @@
+import hashlib
+import logging
+import math
+import os
+import re
+import zlib
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+
+from src.config import (
+    EMBEDDING_DIM, EMBEDDINGS_PATH, CLASSIFIER_MAX_CHARS,
+    IVF_TRAIN_SAMPLE, IVF_KMEANS_ITERATIONS, IVF_NPROBE, RELATED_THRESHOLD, RELATED_NEIGHBOURS,
+    EMBEDDING_REBUILD_SHARE
+)
+
+logger = logging.getLogger(__name__)
+
+TOKEN_RE = re.compile(r"[a-z][a-z0-9]+")
+CHUNK_ROWS = 65536
+
+
+class HashingEmbedder:
+    """
+    Fixed-size text vectors without a vocabulary or a model: each token is hashed
+    to one of `dim` signed buckets, weighted by sublinear term frequency.
+    Filename tokens are included so empty (tier-1 / image) entries still get a vector.
+    """
+
+    def __init__(self, dim=EMBEDDING_DIM):
+        self.dim = dim
+
+    def embed(self, text, filename=""):
+        counts = Counter(TOKEN_RE.findall((text or "")[:CLASSIFIER_MAX_CHARS].lower()))
+        counts.update(TOKEN_RE.findall(filename.lower().replace("_", " ")))
+        vec = np.zeros(self.dim, dtype=np.float32)
+        if not counts:
+            return vec
+        hashes = np.fromiter((zlib.crc32(t.encode("utf-8")) for t in counts), dtype=np.uint64, count=len(counts))
+        weights = np.fromiter((1 + math.log(n) for n in counts.values()), dtype=np.float32, count=len(counts))
+        signs = np.where(hashes & 0x80000000, -1.0, 1.0).astype(np.float32)
+        np.add.at(vec, (hashes % self.dim).astype(np.intp), signs * weights)
+        return vec
+
+
+class SimilarityIndex:
+    """
+    Approximate nearest neighbours over document embeddings.
+    Vectors live in a float32 memory-mapped matrix (row = doc id - 1), so the index
+    costs page cache rather than heap. An inverted-file (IVF) layer of k-means centroids
+    narrows each query to the few lists nearest the query vector.
+    Rows are positions in one particular index, so the IVF file also stores that index's
+    fingerprint and callers check matches() before trusting a row for a doc id.
+    """
+
+    def __init__(self, path=EMBEDDINGS_PATH, dim=EMBEDDING_DIM):
+        self.vectors_path = Path(path).with_suffix(".npy")
+        self.ivf_path = Path(path).with_name(Path(path).name + "_ivf.npz")
+        self.dim = dim
+        self.vectors = None
+        self.centroids = None
+        self.order = None
+        self.offsets = None
+        self.fingerprint = None
+        self.idf = None
+
+    @staticmethod
+    def index_fingerprint(entries):
+        """Entry count plus a hash of every original_path in id order."""
+        digest = hashlib.blake2b(digest_size=16)
+        for entry in sorted(entries, key=lambda e: e["id"]):
+            digest.update((entry.get("original_path") or "").encode("utf-8") + b"\0")
+        return f"{len(entries)}-{digest.hexdigest()}"
+
+    def exists(self):
+        return self.vectors_path.exists() and self.ivf_path.exists()
+
+    def version(self):
+        """Changes whenever build() or update() publishes a new index (the IVF file is replaced last)."""
+        try:
+            return os.stat(self.ivf_path).st_mtime_ns
+        except OSError:
+            return None
+
+    def matches(self, entries):
+        """True if the loaded vectors were built from exactly these entries."""
+        return self.fingerprint is not None and self.fingerprint == self.index_fingerprint(entries)
+
+    def build(self, entries):
+        """Embed every entry's text and train the IVF lists. Entries need id/full_text/filename."""
+        count = max((entry["id"] for entry in entries), default=0)
+        if not count:
+            return self
+        embedder = HashingEmbedder(self.dim)
+        vectors = np.lib.format.open_memmap(self.vectors_path.with_suffix(".tmp.npy"), mode="w+",
+                                            dtype=np.float32, shape=(count, self.dim))
+        for entry in entries:
+            vectors[entry["id"] - 1] = embedder.embed(entry.get("full_text"), entry.get("filename") or "")
+
+        # IDF over hashed buckets, then unit length so dot product = cosine
+        df = np.zeros(self.dim, dtype=np.int64)
+        for start in range(0, count, CHUNK_ROWS):
+            df += np.count_nonzero(vectors[start:start + CHUNK_ROWS], axis=0)
+        idf = np.log((1 + count) / (1 + df)).astype(np.float32) + 1
+        for start in range(0, count, CHUNK_ROWS):
+            chunk = vectors[start:start + CHUNK_ROWS] * idf
+            norms = np.linalg.norm(chunk, axis=1, keepdims=True)
+            vectors[start:start + CHUNK_ROWS] = chunk / np.where(norms == 0, 1, norms)
+        vectors.flush()
+        del vectors
+        self.vectors_path.with_suffix(".tmp.npy").replace(self.vectors_path)
+
+        self.vectors = np.load(self.vectors_path, mmap_mode="r")
+        self.idf = idf
+        self.centroids = self._train(count)
+        assignments = np.concatenate([
+            self._nearest_list(self.vectors[start:start + CHUNK_ROWS])
+            for start in range(0, count, CHUNK_ROWS)
+        ])
+        self._publish(entries, assignments)
+        logger.info(f"Similarity index: {count} vectors in {len(self.centroids)} lists at {self.vectors_path}")
+        return self
+
+    def update(self, entries, previous_rows, changed):
+        """
+        Bring the published index in line with `entries` re-embedding only the `changed`
+        original paths. previous_rows maps each original path of the index the published
+        vectors were built from to its row there; every other entry's vector is copied over.
+        IDF weights and IVF centroids stay as trained, so a large change falls back to build().
+        """
+        count = max((entry["id"] for entry in entries), default=0)
+        previous = [{"id": row + 1, "original_path": path} for path, row in previous_rows.items()]
+        try:
+            self.load()
+        except (OSError, KeyError, ValueError):
+            return self.build(entries)
+        if (not self.matches(previous) or self.idf is None or not count
+                or len(changed) > count * EMBEDDING_REBUILD_SHARE):
+            return self.build(entries)
+
+        old_assignments = np.empty(len(self.order), dtype=np.int64)
+        for l in range(len(self.centroids)):
+            old_assignments[self.order[self.offsets[l]:self.offsets[l + 1]]] = l
+
+        kept_old, kept_new, fresh = [], [], []
+        for entry in entries:
+            row = previous_rows.get(entry.get("original_path"))
+            if row is None or entry.get("original_path") in changed:
+                fresh.append(entry)
+            else:
+                kept_old.append(row)
+                kept_new.append(entry["id"] - 1)
+        kept_old, kept_new = np.array(kept_old, dtype=np.int64), np.array(kept_new, dtype=np.int64)
+
+        tmp_vectors_path = self.vectors_path.with_suffix(".tmp.npy")
+        vectors = np.lib.format.open_memmap(tmp_vectors_path, mode="w+", dtype=np.float32, shape=(count, self.dim))
+        assignments = np.zeros(count, dtype=np.int64)
+        for start in range(0, len(kept_old), CHUNK_ROWS):
+            rows = slice(start, start + CHUNK_ROWS)
+            vectors[kept_new[rows]] = self.vectors[kept_old[rows]]  # Renumbering keeps id order, reads stay sequential
+            assignments[kept_new[rows]] = old_assignments[kept_old[rows]]
+
+        embedder = HashingEmbedder(self.dim)
+        for entry in fresh:
+            vec = embedder.embed(entry.get("full_text"), entry.get("filename") or "") * self.idf
+            norm = np.linalg.norm(vec)
+            vectors[entry["id"] - 1] = vec / norm if norm else vec
+        if fresh:
+            rows = np.array([entry["id"] - 1 for entry in fresh], dtype=np.int64)
+            assignments[rows] = self._nearest_list(vectors[rows])
+        vectors.flush()
+        del vectors
+        tmp_vectors_path.replace(self.vectors_path)
+
+        self.vectors = np.load(self.vectors_path, mmap_mode="r")
+        self._publish(entries, assignments)
+        logger.info(f"Similarity index: {len(fresh)} of {count} vectors re-embedded at {self.vectors_path}")
+        return self
+
+    def _publish(self, entries, assignments):
+        """Write the IVF lists for these row assignments; replacing the file is what publishes."""
+        self.order = np.argsort(assignments, kind="stable").astype(np.int64)
+        self.offsets = np.searchsorted(assignments[self.order], np.arange(len(self.centroids) + 1))
+        self.fingerprint = self.index_fingerprint(entries)
+        tmp_path = self.ivf_path.with_name(self.ivf_path.name + ".tmp")
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, centroids=self.centroids, order=self.order, offsets=self.offsets,
+                     fingerprint=np.array(self.fingerprint), idf=self.idf)
+        os.replace(tmp_path, self.ivf_path)
+
+    def load(self):
+        self.vectors = np.load(self.vectors_path, mmap_mode="r")
+        with np.load(self.ivf_path) as ivf:
+            self.centroids = ivf["centroids"]
+            self.order = ivf["order"]
+            self.offsets = ivf["offsets"]
+            # Files from before fingerprints existed never match, so they are rebuilt rather than trusted
+            self.fingerprint = str(ivf["fingerprint"]) if "fingerprint" in ivf.files else None
+            self.idf = ivf["idf"] if "idf" in ivf.files else None
+        return self
+
+    def similar(self, doc_id, k=10, nprobe=IVF_NPROBE):
+        """Up to k (doc id, cosine score) pairs most similar to doc_id, best first."""
+        if self.vectors is None or not 0 < doc_id <= len(self.vectors):
+            return []
+        query = np.asarray(self.vectors[doc_id - 1])
+        if not query.any():
+            return []
+
+        nprobe = min(nprobe, len(self.centroids))
+        lists = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+        candidates = np.concatenate([self.order[self.offsets[l]:self.offsets[l + 1]] for l in lists])
+        candidates = np.sort(candidates[candidates != doc_id - 1])  # Sorted rows read the memmap sequentially
+        if not len(candidates):
+            return []
+        scores = self.vectors[candidates] @ query
+
+        top = np.argpartition(-scores, min(k, len(scores)) - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(candidates[i]) + 1, float(scores[i])) for i in top if scores[i] > 0]
+
+    def related_groups(self, doc_ids, threshold=RELATED_THRESHOLD, k=RELATED_NEIGHBOURS):
+        """Group the given documents with their close neighbours among the same set (union-find)."""
+        wanted = set(doc_ids)
+        parent = {doc_id: doc_id for doc_id in wanted}
+
+        def find(x):
+            while parent[x] != x:
+                parent[x] = parent[parent[x]]
+                x = parent[x]
+            return x
+
+        for doc_id in wanted:
+            for other, score in self.similar(doc_id, k=k):
+                if score < threshold:
+                    break
+                if other in wanted:
+                    parent[find(other)] = find(doc_id)
+
+        groups = {}
+        for doc_id in wanted:
+            groups.setdefault(find(doc_id), []).append(doc_id)
+        return [sorted(group) for group in groups.values() if len(group) > 1]
+
+    def _train(self, count):
+        """Spherical k-means on a sample; about sqrt(n) lists."""
+        n_lists = max(1, min(4096, int(math.sqrt(count))))
+        rng = np.random.default_rng(1)
+        sample_rows = np.sort(rng.choice(count, size=min(count, IVF_TRAIN_SAMPLE), replace=False))
+        sample = np.asarray(self.vectors[sample_rows])
+        sample = sample[sample.any(axis=1)]
+        if not len(sample):
+            return np.zeros((1, self.dim), dtype=np.float32)
+        n_lists = min(n_lists, len(sample))
+
+        centroids = sample[rng.choice(len(sample), size=n_lists, replace=False)].copy()
+        for _ in range(IVF_KMEANS_ITERATIONS):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, sample)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            # Empty lists keep their previous centroid
+            centroids = np.where(norms > 0, sums / np.where(norms == 0, 1, norms), centroids)
+        return centroids.astype(np.float32)
+
+    def _nearest_list(self, chunk):
+        return np.argmax(np.asarray(chunk) @ self.centroids.T, axis=1)
@@ -1,7 +1,11 @@
 import os
+import codecs
+import io
 from pathlib import Path
 import logging
 
+from src.config import TEXT_READ_CHUNK_BYTES, TEXT_HEAD_BYTES, TEXT_TAIL_BYTES
+
 try:
     import fitz  # PyMuPDF
 except ImportError:
@@ -15,51 +19,146 @@ except ImportError:
 
 logger = logging.getLogger(__name__)
 
+TRUNCATION_MARKER = "\n[...]\n"
+
+# Longest first so UTF-32 LE is not mistaken for UTF-16 LE
+BOMS = [
+    (codecs.BOM_UTF32_LE, "utf-32-le"),
+    (codecs.BOM_UTF32_BE, "utf-32-be"),
+    (codecs.BOM_UTF8, "utf-8"),
+    (codecs.BOM_UTF16_LE, "utf-16-le"),
+    (codecs.BOM_UTF16_BE, "utf-16-be"),
+]
+CODE_UNIT_BYTES = {"utf-16-le": 2, "utf-16-be": 2, "utf-32-le": 4, "utf-32-be": 4}
+
+TEXT_TYPES = {"txt"}
+CODE_TYPES = {"py", "js", "ts", "html", "css", "json", "sql", "md"}
+IMAGE_TYPES = {"png", "jpg", "jpeg", "tiff"}
+
 class ContentExtractor:
-    def extract(self, file_path):
-        """Extract text and metadata from file."""
+    def describe(self, file_path, stats=None):
+        """Metadata from a single stat() - no content read (quick pass)."""
         file_path = Path(file_path)
-        stats = file_path.stat()
-        
-        metadata = {
+        stats = stats or file_path.stat()
+        return {
             "filename": file_path.name,
             "file_size": stats.st_size,
             "file_date": stats.st_mtime,
-            "file_type": file_path.suffix.lower().lstrip('.')
+            "file_type": file_path.suffix.lower().lstrip('.'),
+            "text_truncated": False
         }
+
+    def extract(self, file_path, data=None, stats=None):
+        """
+        Extract text and metadata from file.
+        data/stats: optional prefetched file content and stat result, so no I/O is repeated.
+        """
+        file_path = Path(file_path)
+        metadata = self.describe(file_path, stats)
         
         text_content = ""
         
         try:
-            if metadata["file_type"] == "txt":
-                text_content = file_path.read_text(errors='ignore')
+            if metadata["file_type"] in TEXT_TYPES:
+                text_content, metadata["text_truncated"] = self._read_text_window(file_path, data)
             elif metadata["file_type"] == "pdf":
                 if fitz:
                     try:
-                        with fitz.open(file_path) as doc:
+                        source = fitz.open(stream=data, filetype="pdf") if data is not None else fitz.open(file_path)
+                        with source as doc:
                             # Extract text from first 5 pages to keep it performant but detailed
                             for i, page in enumerate(doc):
                                 if i > 5: break 
                                 text_content += page.get_text() + "\n"
+                        text_content, metadata["text_truncated"] = self._bound(text_content)
+                    except MemoryError:
+                        raise
                     except Exception as e:
                         logger.warning(f"PyMuPDF failed for {file_path}: {e}")
                         text_content = "[PDF Error]"
                 else:
                     text_content = "[PDF Extraction Placeholder - PyMuPDF missing]"
-            elif metadata["file_type"] in ["png", "jpg", "jpeg", "tiff"]:
+            elif metadata["file_type"] in IMAGE_TYPES:
                 if pytesseract and Image:
                     try:
-                        text_content = pytesseract.image_to_string(Image.open(file_path))
+                        image = Image.open(io.BytesIO(data)) if data is not None else Image.open(file_path)
+                        text_content = pytesseract.image_to_string(image)
+                    except MemoryError:
+                        raise
                     except Exception as e:
                         text_content = f"[OCR Error: {e}]"
                 else:
                     text_content = "[Image OCR Placeholder - Tesseract/PIL missing]"
-            elif metadata["file_type"] in ["py", "js", "ts", "html", "css", "json", "sql", "md"]:
+            elif metadata["file_type"] in CODE_TYPES:
                 # Code files - read as text
-                text_content = file_path.read_text(errors='ignore')
+                text_content, metadata["text_truncated"] = self._read_text_window(file_path, data)
             else:
                 text_content = f"[Unsupported file type: {metadata['file_type']}]"
+        except MemoryError:
+            # Let the supervising worker quarantine the file
+            raise
         except Exception as e:
             text_content = f"[Extraction Error: {str(e)}]"
 
         return text_content, metadata
+
+    def _read_text_window(self, file_path, data=None):
+        """
+        Stream a text file in chunks, keeping only a bounded head and tail.
+        Returns (text, truncated).
+        """
+        head = bytearray()
+        tail = b""
+        truncated = False
+
+        with (io.BytesIO(data) if data is not None else open(file_path, 'rb')) as f:
+            chunk = f.read(TEXT_READ_CHUNK_BYTES)
+            encoding, bom_length = self._detect_encoding(chunk)
+            if encoding is None:
+                return "[Binary content]", False
+            chunk = chunk[bom_length:]
+
+            while chunk and len(head) < TEXT_HEAD_BYTES:
+                room = TEXT_HEAD_BYTES - len(head)
+                head += chunk[:room]
+                chunk = chunk[room:] or f.read(TEXT_READ_CHUNK_BYTES)
+
+            if chunk:
+                truncated = True
+                try:
+                    # Jump straight to the tail instead of reading the middle
+                    end = f.seek(0, io.SEEK_END)
+                    start = max(end - TEXT_TAIL_BYTES, TEXT_HEAD_BYTES + bom_length)
+                    start -= (start - bom_length) % CODE_UNIT_BYTES.get(encoding, 1)
+                    f.seek(start)
+                    tail = f.read(TEXT_TAIL_BYTES)
+                except (OSError, io.UnsupportedOperation):
+                    # Not seekable (pipe, some network mounts) - stream the rest
+                    while chunk:
+                        tail = (tail + chunk)[-TEXT_TAIL_BYTES:]
+                        chunk = f.read(TEXT_READ_CHUNK_BYTES)
+
+        text = head.decode(encoding, errors='ignore')
+        if truncated:
+            text += TRUNCATION_MARKER + tail.decode(encoding, errors='ignore')
+        return text, truncated
+
+    def _detect_encoding(self, first_block):
+        """Guess (encoding, bom_length) from the first block; encoding None means binary."""
+        for bom, encoding in BOMS:
+            if first_block.startswith(bom):
+                return encoding, len(bom)
+        if b"\x00" in first_block:
+            return None, 0
+        try:
+            # Incremental so a multi-byte char cut at the block edge is not an error
+            codecs.getincrementaldecoder("utf-8")().decode(first_block, final=False)
+            return "utf-8", 0
+        except UnicodeDecodeError:
+            return "latin-1", 0
+
+    def _bound(self, text):
+        """Apply the same head/tail window to text produced by a parser."""
+        if len(text) <= TEXT_HEAD_BYTES + TEXT_TAIL_BYTES:
+            return text, False
+        return text[:TEXT_HEAD_BYTES] + TRUNCATION_MARKER + text[-TEXT_TAIL_BYTES:], True
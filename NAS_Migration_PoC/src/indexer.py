@@ -1,22 +1,45 @@
 import json
 import logging
+import os
 from pathlib import Path
 
+from src.stats import IndexStats
+
 logger = logging.getLogger(__name__)
 
 class ContentIndexer:
-    def __init__(self, output_path="full_content_index.json"):
+    def __init__(self, output_path="full_content_index.json", quarantine_path=None):
         self.output_path = Path(output_path)
+        self.quarantine_path = Path(quarantine_path) if quarantine_path else None
+        self.stats_path = self.output_path.with_name(self.output_path.stem + "_stats.json")
         self.index = []
+        self.quarantined = []
+        self.stats = IndexStats()
 
-    def add_document(self, doc_data, classification):
+    def add_document(self, doc_data, classification, tier=2):
         """
         Add a document to the in-memory index.
         doc_data: dict containing metadata and extracted text
         classification: dict containing category, subfolder, confidence
+        tier: 1 for a filename/metadata-only entry, 2 once content has been extracted
         """
-        entry = {
-            "id": len(self.index) + 1,
+        entry = self._entry(len(self.index) + 1, doc_data, classification, tier)
+        self.index.append(entry)
+        self.stats.add(entry)
+        return entry["id"]
+
+    def update_document(self, doc_id, doc_data, classification, tier=2):
+        """Upgrade an existing entry in place (e.g. tier 1 -> tier 2), keeping its id."""
+        entry = self._entry(doc_id, doc_data, classification, tier)
+        entry["cluster_id"] = self.index[doc_id - 1].get("cluster_id")
+        self.stats.remove(self.index[doc_id - 1])
+        self.index[doc_id - 1] = entry
+        self.stats.add(entry)
+        return doc_id
+
+    def _entry(self, doc_id, doc_data, classification, tier):
+        return {
+            "id": doc_id,
             "filename": doc_data.get("filename"),
             "original_path": doc_data.get("original_file_path"),
             "file_type": doc_data.get("file_type"),
@@ -27,16 +50,78 @@ class ContentIndexer:
             "confidence": classification.get("confidence_score"),
             "tags": classification.get("reasoning", "").split(". "), # Simple tag extraction from reasoning
             "extracted_text_preview": doc_data.get("extracted_text", "")[:200], # Preview for quick UI
-            "full_text": doc_data.get("extracted_text", "") # Store full text for search
+            "full_text": doc_data.get("extracted_text", ""), # Store full text for search
+            "cluster_id": None, # Near-duplicate cluster, set by assign_clusters()
+            "classifier_version": classification.get("classifier_version"),
+            "tier": tier
         }
-        self.index.append(entry)
+
+    def merge_segment(self, entries, quarantined=()):
+        """Append a partial index built elsewhere, renumbering its ids after ours."""
+        offset = len(self.index)
+        for entry in entries:
+            entry["id"] += offset
+            if entry.get("cluster_id") is not None:
+                entry["cluster_id"] += offset
+            self.index.append(entry)
+            self.stats.add(entry)
+        self.quarantined.extend(quarantined)
+
+    def remove_documents(self, paths):
+        """Drop the entries for these original paths and renumber the rest. Returns the number removed."""
+        paths = set(paths)
+        kept = []
+        for entry in self.index:
+            if entry.get("original_path") in paths:
+                self.stats.remove(entry)
+            else:
+                kept.append(entry)
+        removed = len(self.index) - len(kept)
+        # Cluster ids point at removed or renumbered docs now; assign_clusters() sets them again
+        for doc_id, entry in enumerate(kept, 1):
+            entry["id"] = doc_id
+            entry["cluster_id"] = None
+        self.index = kept
+        return removed
+
+    def assign_clusters(self, clusters):
+        """Record near-duplicate cluster ids (doc id -> representative doc id)."""
+        for entry in self.index:
+            entry["cluster_id"] = clusters.get(entry["id"], entry["id"])
+
+    def load(self):
+        """Load a previously saved index (empty if there is none yet)."""
+        if self.output_path.exists():
+            with open(self.output_path, 'r', encoding='utf-8') as f:
+                self.index = json.load(f)
+        self.stats = IndexStats()
+        for entry in self.index:
+            self.stats.add(entry)
+        return self.index
+
+    def add_quarantined(self, file_path, reason):
+        """Record a file that was skipped because extraction misbehaved."""
+        self.quarantined.append({
+            "original_path": str(file_path),
+            "filename": Path(file_path).name,
+            "reason": reason,
+        })
 
     def save(self):
-        """Save the index to a JSON file."""
+        """Save the index to a JSON file (atomically, readers never see a half-written index)."""
         try:
-            with open(self.output_path, 'w', encoding='utf-8') as f:
+            # Stats first, so whoever reacts to the new index also finds matching stats
+            self.stats.save(self.stats_path)
+            tmp_path = self.output_path.with_name(self.output_path.name + ".tmp")
+            with open(tmp_path, 'w', encoding='utf-8') as f:
                 json.dump(self.index, f, indent=2, default=str)
+            os.replace(tmp_path, self.output_path)
             logger.info(f"Successfully saved index with {len(self.index)} documents to {self.output_path}")
+            if self.quarantine_path:
+                with open(self.quarantine_path, 'w', encoding='utf-8') as f:
+                    json.dump(self.quarantined, f, indent=2)
+                if self.quarantined:
+                    logger.warning(f"{len(self.quarantined)} files quarantined, see {self.quarantine_path}")
             return str(self.output_path)
         except Exception as e:
             logger.error(f"Failed to save index: {e}")
@@ -0,0 +1,184 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+
+from src.config import MOVE_JOURNAL_PATH, JOURNAL_SYNC_EVERY
+
+logger = logging.getLogger(__name__)
+
+COPY_CHUNK_BYTES = 1024 * 1024
+
+# Entry lifecycle: planned -> copied -> done, or -> rolled_back / failed; done -> undone
+IN_FLIGHT_STATES = ("planned", "copied")
+
+
+def copy_with_hash(source, destination):
+    """
+    Copy a file (data + metadata) and return the blake2b of its content in one read pass.
+    The copy and its directory entry are on disk when this returns, so the source may go.
+    """
+    hasher = hashlib.blake2b(digest_size=16)
+    with open(source, 'rb') as src, open(destination, 'wb') as dst:
+        while True:
+            chunk = src.read(COPY_CHUNK_BYTES)
+            if not chunk:
+                break
+            hasher.update(chunk)
+            dst.write(chunk)
+        dst.flush()
+        os.fsync(dst.fileno())
+    shutil.copystat(source, destination)
+    fsync_dir(Path(destination).parent)
+    return hasher.hexdigest()
+
+
+def fsync_dir(directory):
+    """Persist a directory's entries (new or renamed files); a no-op where directories can't be opened."""
+    if os.name != "posix":
+        return
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def file_hash(path):
+    hasher = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(COPY_CHUNK_BYTES), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+class MoveJournal:
+    """
+    Append-only JSON-lines journal of organization moves.
+    Records are buffered and fsynced in batches; replaying the journal is enough to
+    finish or roll back whatever was in flight, or to undo a whole run.
+    """
+
+    def __init__(self, path=MOVE_JOURNAL_PATH, sync_every=JOURNAL_SYNC_EVERY):
+        self.path = Path(path)
+        self.sync_every = sync_every
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._tail_checked = False
+
+    def begin_run(self):
+        return time.strftime("%Y%m%d-%H%M%S") + f"-{os.getpid()}"
+
+    def record(self, run_id, seq, state, sync=False, **fields):
+        """Buffer a record; with sync=True it (and everything buffered before it) is on disk on return."""
+        with self._lock:
+            self._buffer.append({"run": run_id, "seq": seq, "state": state, "ts": time.time(), **fields})
+            if len(self._buffer) >= self.sync_every:
+                self._flush_locked()
+        if sync:
+            # Separate lock round: records other threads appended meanwhile share this fsync
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if not self._buffer:
+            return
+        with open(self.path, 'a', encoding='utf-8') as f:
+            if not self._tail_checked:
+                # A crash may have left a torn last line; never glue new records onto it
+                if f.tell() and not self._ends_with_newline():
+                    f.write("\n")
+                self._tail_checked = True
+            f.write("".join(json.dumps(r) + "\n" for r in self._buffer))
+            f.flush()
+            os.fsync(f.fileno())
+        self._buffer = []
+
+    def _ends_with_newline(self):
+        with open(self.path, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b"\n"
+
+    def entries(self):
+        """Replay the journal: (run, seq) -> latest merged record, in journal order."""
+        entries = {}
+        if not self.path.exists():
+            return entries
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # Torn write from a crash, the entry stays at its previous state
+                key = (record["run"], record["seq"])
+                entries[key] = {**entries.get(key, {}), **record}
+        return entries
+
+    def recover(self, cleanup=None):
+        """Finish or roll back entries a crashed run left in flight. Returns (finished, rolled_back)."""
+        finished = rolled_back = 0
+        for (run_id, seq), entry in self.entries().items():
+            if entry["state"] not in IN_FLIGHT_STATES:
+                continue
+            source, destination = Path(entry["source"]), Path(entry["destination"])
+
+            if entry.get("action") == "skip" or self._is_complete(entry, destination):
+                if source.exists() and cleanup:
+                    cleanup(source)
+                self.record(run_id, seq, "done", recovered=True)
+                finished += 1
+            elif source.exists():
+                # Partial or corrupt copy - the source is still the truth
+                if destination.exists():
+                    destination.unlink()
+                self.record(run_id, seq, "rolled_back")
+                rolled_back += 1
+            else:
+                logger.error(f"Journal entry {run_id}#{seq}: neither intact copy nor source for {source}")
+                self.record(run_id, seq, "failed")
+        self.flush()
+        return finished, rolled_back
+
+    def undo(self, run_id=None):
+        """Put every file of a run (default: the latest) back where it came from."""
+        entries = self.entries()
+        if run_id is None:
+            runs = [run for run, _ in entries]
+            if not runs:
+                return 0
+            run_id = runs[-1]
+
+        restored = 0
+        for (run, seq), entry in sorted(entries.items(), reverse=True):
+            if run != run_id or entry["state"] not in ("done", "copied"):
+                continue
+            source, destination = Path(entry["source"]), Path(entry["destination"])
+            try:
+                if not source.exists():
+                    source.parent.mkdir(parents=True, exist_ok=True)
+                    if entry.get("action") == "skip":
+                        shutil.copy2(destination, source)  # Destination predates this run
+                    else:
+                        shutil.move(str(destination), str(source))
+                elif entry.get("action") != "skip" and destination.exists():
+                    destination.unlink()
+                self.record(run, seq, "undone")
+                restored += 1
+            except OSError as e:
+                logger.error(f"Could not undo {destination} -> {source}: {e}")
+        self.flush()
+        return restored
+
+    def _is_complete(self, entry, destination):
+        if not destination.exists() or destination.stat().st_size != entry.get("size"):
+            return False
+        # Without a recorded hash the copy was never confirmed, however right its size looks
+        expected = entry.get("hash")
+        return expected is not None and file_hash(destination) == expected
@@ -0,0 +1,231 @@
+import json
+import os
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from difflib import get_close_matches
+from pathlib import Path, PurePosixPath
+
+from tqdm import tqdm
+
+from src.config import OLD_NAS_PATH, MOVE_WORKERS
+from src.journal import copy_with_hash, file_hash
+
+
+def _scan_dir(directory):
+    """One listing per directory: name -> size for regular files (empty if missing)."""
+    entries = {}
+    try:
+        with os.scandir(directory) as it:
+            for entry in it:
+                try:
+                    if entry.is_file():
+                        entries[entry.name] = entry.stat().st_size
+                except OSError:
+                    continue
+    except (FileNotFoundError, NotADirectoryError, PermissionError):
+        pass
+    return entries
+
+
+class MovePlan:
+    """The full set of moves for one organization run, resolved before anything is touched."""
+
+    def __init__(self, destination_root):
+        self.destination_root = Path(destination_root)
+        self.moves = []      # {"filename", "source", "destination", "size", "action"}
+        self.folders = []    # Destination folders to create, each once
+        self.missing = []    # Matched in the index but no source file found
+        self.unmatched = []  # AI keys that match nothing in the index
+
+    def summary(self):
+        copies = sum(1 for m in self.moves if m["action"] == "copy")
+        return (f"{copies} to copy, {len(self.moves) - copies} already in place, "
+                f"{len(self.folders)} folders, {len(self.missing)} missing sources, "
+                f"{len(self.unmatched)} unmatched")
+
+    def to_dict(self):
+        return {
+            "destination_root": str(self.destination_root),
+            "folders": [str(f) for f in self.folders],
+            "moves": [{**m, "source": str(m["source"]), "destination": str(m["destination"])} for m in self.moves],
+            "missing": self.missing,
+            "unmatched": self.unmatched,
+        }
+
+    def save(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+
+class MovePlanner:
+    """Turns an AI file_mapping into a MovePlan using one directory listing per folder."""
+
+    def __init__(self, destination_root, fallback_source_dir=OLD_NAS_PATH):
+        self.destination_root = Path(destination_root)
+        self.fallback_source_dir = Path(fallback_source_dir) if fallback_source_dir else None
+
+    def build(self, file_mapping, documents):
+        plan = MovePlan(self.destination_root)
+        doc_map = {d['filename'].lower().strip(): d for d in documents}
+
+        # 1. Match AI keys to index entries (exact, URL-decoded, then fuzzy for leftovers)
+        matched = []
+        for filename, suggested_path in file_mapping.items():
+            key = filename.lower().strip()
+            doc = doc_map.get(key) or doc_map.get(urllib.parse.unquote(key))
+            if not doc:
+                close = get_close_matches(key, doc_map.keys(), n=1, cutoff=0.8)
+                doc = doc_map[close[0]] if close else None
+            if doc:
+                matched.append((filename, doc, suggested_path))
+            else:
+                plan.unmatched.append(filename)
+
+        # 2. Resolve sources with one listing per parent directory
+        listings = {}
+
+        def listing(directory):
+            if directory not in listings:
+                listings[directory] = _scan_dir(directory)
+            return listings[directory]
+
+        resolved = []
+        seen = set()
+        for filename, doc, suggested_path in matched:
+            source = self._resolve_source(filename, doc, listing)
+            if source is None:
+                plan.missing.append(filename)
+                continue
+            if source in seen:
+                continue  # Same file mapped twice (fuzzy or cluster match), first wins
+            seen.add(source)
+            resolved.append((source, listing(source.parent)[source.name], suggested_path))
+
+        # 3. A same-name, same-size file at the destination is only "already organized" if the
+        #    bytes match too; hash those pairs in parallel (anything else is a name conflict)
+        candidates = []
+        for source, size, suggested_path in resolved:
+            dest_folder = self._dest_folder(suggested_path)
+            if listing(dest_folder).get(source.name) == size:
+                candidates.append((source, dest_folder / source.name))
+        identical = self._identical(candidates)
+
+        # 4. Destinations: list each target folder once and settle name conflicts up front
+        taken = {}
+        folders = set()
+        for source, size, suggested_path in resolved:
+            dest_folder = self._dest_folder(suggested_path)
+            existing = listing(dest_folder)
+            if dest_folder not in taken:
+                taken[dest_folder] = set()
+                if not existing:
+                    folders.add(dest_folder)  # mkdir is idempotent, no need to stat first
+
+            destination = dest_folder / source.name
+            action = "copy"
+            if source in identical and source.name not in taken[dest_folder]:
+                action = "skip"  # Same file already organized by an earlier run
+            else:
+                counter = 1
+                while destination.name in existing or destination.name in taken[dest_folder]:
+                    destination = dest_folder / f"{source.stem}_{counter}{source.suffix}"
+                    counter += 1
+            taken[dest_folder].add(destination.name)
+
+            plan.moves.append({
+                "filename": source.name,
+                "source": source,
+                "destination": destination,
+                "size": size,
+                "action": action,
+            })
+
+        plan.folders = sorted(folders)
+        return plan
+
+    def _identical(self, pairs):
+        """Sources whose content hash equals that of their same-name destination file."""
+        def same(pair):
+            try:
+                return file_hash(pair[0]) == file_hash(pair[1])
+            except OSError:
+                return False  # Unreadable: not provably the same file, so never skip it
+
+        with ThreadPoolExecutor(max_workers=MOVE_WORKERS) as pool:
+            return {source for (source, _), match in zip(pairs, pool.map(same, pairs)) if match}
+
+    def _resolve_source(self, filename, doc, listing):
+        candidates = []
+        original = doc.get('original_path') or doc.get('original_file_path')
+        if original:
+            candidates.append(Path(original))
+        # Fallback to the source folder if the indexed path moved
+        if self.fallback_source_dir:
+            candidates.append(self.fallback_source_dir / filename)
+            if doc.get('filename'):
+                candidates.append(self.fallback_source_dir / doc['filename'])
+
+        for candidate in candidates:
+            if candidate.name in listing(candidate.parent):
+                return candidate
+        return None
+
+    def _dest_folder(self, suggested_path):
+        # Keep AI-suggested paths inside the destination root
+        parts = [p for p in PurePosixPath(str(suggested_path).replace("\\", "/")).parts
+                 if p not in ("/", "..", ".")]
+        return self.destination_root.joinpath(*parts)
+
+
+class MoveExecutor:
+    """Carries out a MovePlan in parallel with a single progress bar, journaling each step."""
+
+    def __init__(self, workers=MOVE_WORKERS, cleanup=None, journal=None):
+        self.workers = workers
+        self.cleanup = cleanup
+        self.journal = journal
+        self.run_id = None
+
+    def run(self, plan):
+        plan.destination_root.mkdir(parents=True, exist_ok=True)
+        for folder in plan.folders:
+            folder.mkdir(parents=True, exist_ok=True)
+
+        if self.journal:
+            # All intents hit the disk with a single fsync before any file is touched
+            self.run_id = self.journal.begin_run()
+            for seq, move in enumerate(plan.moves):
+                move["seq"] = seq
+                self.journal.record(self.run_id, seq, "planned", action=move["action"],
+                                    source=str(move["source"]), destination=str(move["destination"]),
+                                    size=move["size"])
+            self.journal.flush()
+
+        organized_count = 0
+        failures = []
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = {pool.submit(self._execute, move): move for move in plan.moves}
+            for future in tqdm(as_completed(futures), total=len(futures), desc="Organizing", unit="file"):
+                try:
+                    future.result()
+                    organized_count += 1
+                except Exception as e:
+                    failures.append((futures[future]["filename"], e))
+
+        if self.journal:
+            self.journal.flush()
+        for filename, error in failures:
+            print(f"✗ Failed move {filename}: {error}")
+        return organized_count
+
+    def _execute(self, move):
+        if move["action"] == "copy":
+            # copy_with_hash returns only once the copy is durable
+            digest = copy_with_hash(move["source"], move["destination"])
+            if self.journal:
+                # The source may only go once the journal can prove the copy
+                self.journal.record(self.run_id, move["seq"], "copied", sync=bool(self.cleanup), hash=digest)
+        if self.cleanup:
+            self.cleanup(move["source"])
+        if self.journal:
+            self.journal.record(self.run_id, move["seq"], "done")
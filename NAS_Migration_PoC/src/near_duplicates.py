@@ -0,0 +1,161 @@
+import hashlib
+import os
+import random
+import re
+from collections import defaultdict
+from pathlib import Path
+
+import numpy as np
+
+from src.config import (
+    MINHASH_PERMUTATIONS, MINHASH_BANDS, SHINGLE_WORDS, SHINGLE_SAMPLE_MOD,
+    NEAR_DUPLICATE_MIN_SHINGLES, NEAR_DUPLICATE_THRESHOLD, MINHASH_PATH
+)
+
+WORD_RE = re.compile(r"\w+")
+SHINGLE_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+MIX_MULTIPLIER = np.uint64(0xBF58476D1CE4E5B9)
+SIGNATURE_CHUNK = 4096  # Shingles per (permutations x shingles) block, bounds peak memory
+
+
+def _hash64(value):
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def _file_key(entry):
+    """Identifies the file version a signature was computed from (path, size and date)."""
+    return f"{entry.get('original_path')}\0{entry.get('file_size')}\0{entry.get('file_date')}"
+
+
+class NearDuplicateDetector:
+    """
+    Clusters near-identical documents (resume_v3.pdf vs resume_final.pdf) with MinHash + LSH.
+    Shingles are sampled by their own hash (content-defined), so every document keeps
+    the same subset of shared shingles and the Jaccard estimate stays comparable.
+    Hashing is vectorised with numpy (uint64 arithmetic wraps, which multiply-shift
+    hashing relies on), cheap enough to run inside each extraction worker.
+    """
+
+    def __init__(self, num_perm=MINHASH_PERMUTATIONS, bands=MINHASH_BANDS,
+                 threshold=NEAR_DUPLICATE_THRESHOLD, seed=1):
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be divisible by bands ({bands})")
+        rng = random.Random(seed)
+        # Multiply-add-shift permutations: odd 64-bit multipliers, keep the high 32 bits
+        self.perm_mul = np.array([rng.getrandbits(64) | 1 for _ in range(num_perm)], dtype=np.uint64)[:, None]
+        self.perm_add = np.array([rng.getrandbits(64) for _ in range(num_perm)], dtype=np.uint64)[:, None]
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+        self.buckets = defaultdict(list)  # (band, band values) -> doc ids
+        self.signatures = {}
+        self.parent = {}
+
+    def signature(self, text):
+        """MinHash signature of the text, or None if there is too little content."""
+        if not text or (text.startswith("[") and text.rstrip().endswith("]") and len(text) < 200):
+            return None  # Extractor placeholders like "[PDF Error]"
+
+        words = WORD_RE.findall(text.lower())
+        if len(words) < SHINGLE_WORDS:
+            return None
+        vocabulary = {word: _hash64(word) for word in set(words)}  # One blake2b per distinct word
+        word_hashes = np.fromiter(map(vocabulary.__getitem__, words), dtype=np.uint64, count=len(words))
+
+        # Polynomial hash over each window of SHINGLE_WORDS words, then a finalising mix
+        count = len(words) - SHINGLE_WORDS + 1
+        shingles = np.zeros(count, dtype=np.uint64)
+        for offset in range(SHINGLE_WORDS):
+            shingles = shingles * SHINGLE_MULTIPLIER + word_hashes[offset:offset + count]
+        shingles ^= shingles >> np.uint64(31)
+        shingles *= MIX_MULTIPLIER
+        shingles ^= shingles >> np.uint64(29)
+        shingles = np.unique(shingles[shingles % np.uint64(SHINGLE_SAMPLE_MOD) == 0])
+        if len(shingles) < NEAR_DUPLICATE_MIN_SHINGLES:
+            return None
+
+        signature = np.full(len(self.perm_mul), np.iinfo(np.uint64).max, dtype=np.uint64)
+        for start in range(0, len(shingles), SIGNATURE_CHUNK):
+            chunk = shingles[start:start + SIGNATURE_CHUNK]
+            hashed = (self.perm_mul * chunk + self.perm_add) >> np.uint64(32)
+            np.minimum(signature, hashed.min(axis=1), out=signature)
+        return tuple(signature.tolist())
+
+    def similarity(self, sig_a, sig_b):
+        """Estimated Jaccard similarity of two signatures."""
+        return sum(1 for x, y in zip(sig_a, sig_b) if x == y) / len(sig_a)
+
+    def add(self, doc_id, text):
+        """Index a document and merge it with any near-duplicate already seen."""
+        self.add_signature(doc_id, self.signature(text))
+
+    def add_signature(self, doc_id, sig):
+        """Like add(), with a signature computed elsewhere (e.g. by a shard worker)."""
+        self.parent[doc_id] = doc_id
+        if sig is None:
+            return
+        sig = tuple(sig)  # Lists after a JSON round-trip; band keys must be hashable
+        self.signatures[doc_id] = sig
+
+        for band in range(self.bands):
+            key = (band, sig[band * self.rows:(band + 1) * self.rows])
+            bucket = self.buckets[key]
+            for other_id in bucket:
+                if self._find(other_id) == self._find(doc_id):
+                    continue
+                if self.similarity(sig, self.signatures[other_id]) >= self.threshold:
+                    self._union(doc_id, other_id)
+            bucket.append(doc_id)
+
+    def save(self, entries, path=MINHASH_PATH):
+        """Persist the signatures of these index entries, keyed by file version, for restore()."""
+        keys, rows = [], []
+        for entry in entries:
+            sig = self.signatures.get(entry["id"])
+            if sig is not None:
+                keys.append(_file_key(entry))
+                rows.append(sig)
+        path = Path(path)
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, keys=np.array(keys, dtype=str),
+                     signatures=np.array(rows, dtype=np.uint32).reshape(len(rows), len(self.perm_mul)))
+        os.replace(tmp_path, path)
+
+    def restore(self, entries, path=MINHASH_PATH):
+        """
+        Add index entries using the signatures save() stored for the same file version;
+        only entries without one are MinHashed from their text. Returns the number reused.
+        """
+        saved = {}
+        if Path(path).exists():
+            with np.load(path) as data:
+                if data["signatures"].shape[1:] == (len(self.perm_mul),):
+                    saved = dict(zip(data["keys"].tolist(), data["signatures"].tolist()))
+        reused = 0
+        for entry in entries:
+            sig = saved.get(_file_key(entry))
+            if sig is not None:
+                self.add_signature(entry["id"], sig)
+                reused += 1
+            else:
+                self.add(entry["id"], entry.get("full_text") or "")
+        return reused
+
+    def clusters(self):
+        """Map each doc id to its cluster id (the smallest doc id in the cluster)."""
+        return {doc_id: self._find(doc_id) for doc_id in self.parent}
+
+    def _find(self, doc_id):
+        root = doc_id
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[doc_id] != root:
+            self.parent[doc_id], doc_id = root, self.parent[doc_id]
+        return root
+
+    def _union(self, a, b):
+        root_a, root_b = self._find(a), self._find(b)
+        if root_a != root_b:
+            # Smallest id wins so cluster ids are stable across runs
+            self.parent[max(root_a, root_b)] = min(root_a, root_b)
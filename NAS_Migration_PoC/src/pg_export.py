@@ -0,0 +1,199 @@
+import json
+import logging
+import time
+
+from src.config import PG_TABLE, PG_COPY_BATCH_ROWS, PG_MAINTENANCE_WORK_MEM
+
+try:
+    import psycopg2
+except ImportError:
+    psycopg2 = None
+
+logger = logging.getLogger(__name__)
+
+# (index field, staging column type); original_path is the natural key across re-scans
+COLUMNS = [
+    ("original_path", "text"),
+    ("id", "bigint"),
+    ("filename", "text"),
+    ("file_type", "text"),
+    ("file_size", "bigint"),
+    ("file_date", "double precision"),  # Epoch seconds, converted during the merge
+    ("category", "text"),
+    ("subfolder", "text"),
+    ("confidence", "integer"),
+    ("tags", "jsonb"),
+    ("extracted_text_preview", "text"),
+    ("full_text", "text"),
+    ("cluster_id", "bigint"),
+    ("classifier_version", "text"),
+    ("tier", "smallint"),
+]
+
+COPY_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r", "\x00": ""})
+
+
+def copy_value(value):
+    """One field in COPY text format."""
+    if value is None:
+        return "\\N"
+    if isinstance(value, (list, dict)):
+        value = json.dumps(value)
+    return str(value).translate(COPY_ESCAPES)
+
+
+class _RowStream:
+    """File-like view of index entries as COPY text rows, so a batch is never materialized."""
+
+    def __init__(self, entries):
+        self._lines = ("\t".join(copy_value(entry.get(name)) for name, _ in COLUMNS) + "\n" for entry in entries)
+        self._buffer = ""
+
+    def read(self, size=-1):
+        while size < 0 or len(self._buffer) < size:
+            line = next(self._lines, None)
+            if line is None:
+                break
+            self._buffer += line
+        if size < 0:
+            chunk, self._buffer = self._buffer, ""
+        else:
+            chunk, self._buffer = self._buffer[:size], self._buffer[size:]
+        return chunk
+
+
+class PostgresExporter:
+    """
+    Bulk-loads the index into PostgreSQL so many backends can query one shared store.
+    Each batch is COPYed into a temporary staging table and merged with one
+    INSERT .. ON CONFLICT upsert. A first load into an empty table builds the full-text
+    GIN index once, after loading; a re-export keeps the existing index live throughout.
+    """
+
+    def __init__(self, dsn, table=PG_TABLE, batch_rows=PG_COPY_BATCH_ROWS):
+        if psycopg2 is None:
+            raise ImportError("psycopg2 is required for the PostgreSQL export (pip install psycopg2-binary)")
+        self.dsn = dsn
+        self.table = table
+        self.batch_rows = batch_rows
+        self.conn = None
+
+    def connect(self):
+        self.conn = psycopg2.connect(self.dsn)
+
+    def close(self):
+        if self.conn:
+            self.conn.close()
+
+    def export(self, entries, prune=False):
+        """Upsert every entry; prune=True also deletes rows whose file is no longer indexed."""
+        self.connect()
+        try:
+            run_id = int(time.time() * 1000)
+            # A crash can only lose the last batches of a load that is simply re-run
+            self._execute("SET synchronous_commit = off")
+            self.create_tables()
+            # Maintaining the GIN index row by row is far slower than one build at the end, but a
+            # populated table may have concurrent readers that must not fall back to sequential scans
+            if self._is_empty():
+                self._execute(f"DROP INDEX IF EXISTS {self.table}_search")
+
+            loaded = 0
+            for start in range(0, len(entries), self.batch_rows):
+                loaded += self._load_batch(entries[start:start + self.batch_rows], run_id)
+                logger.info(f"Exported {loaded}/{len(entries)} entries to {self.table}")
+
+            if prune:
+                with self.conn.cursor() as cur:
+                    cur.execute(f"DELETE FROM {self.table} WHERE export_run <> %s", (run_id,))
+                    logger.info(f"Pruned {cur.rowcount} entries no longer in the index")
+                self.conn.commit()
+
+            self.create_indexes()
+            return loaded
+        finally:
+            self.close()
+
+    def create_tables(self):
+        self._execute(f"""
+            CREATE TABLE IF NOT EXISTS {self.table} (
+                original_path TEXT PRIMARY KEY,
+                index_id BIGINT,
+                filename TEXT,
+                file_type TEXT,
+                file_size BIGINT,
+                file_date TIMESTAMPTZ,
+                category TEXT,
+                subfolder TEXT,
+                confidence INTEGER,
+                tags JSONB,
+                extracted_text_preview TEXT,
+                full_text TEXT,
+                cluster_id BIGINT,
+                classifier_version TEXT,
+                tier SMALLINT,
+                export_run BIGINT,
+                updated_at TIMESTAMPTZ DEFAULT now()
+            )
+        """)
+
+    def create_indexes(self):
+        with self.conn.cursor() as cur:
+            cur.execute("SET maintenance_work_mem = %s", (PG_MAINTENANCE_WORK_MEM,))
+            cur.execute(f"""
+                CREATE INDEX IF NOT EXISTS {self.table}_search ON {self.table}
+                USING GIN (to_tsvector('english', coalesce(filename, '') || ' ' || coalesce(full_text, '')))
+            """)
+            cur.execute(f"CREATE INDEX IF NOT EXISTS {self.table}_category ON {self.table} (category, subfolder)")
+            cur.execute(f"ANALYZE {self.table}")
+        self.conn.commit()
+
+    def _load_batch(self, batch, run_id):
+        staging = f"{self.table}_staging"
+        columns = ", ".join(name for name, _ in COLUMNS)
+        updates = ", ".join(
+            f"{self._target(name)} = EXCLUDED.{self._target(name)}" for name, _ in COLUMNS if name != "original_path"
+        )
+        with self.conn.cursor() as cur:
+            cur.execute(f"""
+                CREATE TEMP TABLE IF NOT EXISTS {staging} ({", ".join(f"{n} {t}" for n, t in COLUMNS)})
+            """)
+            cur.execute(f"TRUNCATE {staging}")
+            cur.copy_expert(f"COPY {staging} ({columns}) FROM STDIN", _RowStream(batch), size=1024 * 1024)
+
+            # Last entry wins if a path occurs twice in the batch (ON CONFLICT may touch a row only once)
+            cur.execute(f"""
+                INSERT INTO {self.table} (
+                    original_path, index_id, filename, file_type, file_size, file_date, category, subfolder,
+                    confidence, tags, extracted_text_preview, full_text, cluster_id, classifier_version, tier,
+                    export_run
+                )
+                SELECT DISTINCT ON (original_path)
+                    original_path, id, filename, file_type, file_size, to_timestamp(file_date), category, subfolder,
+                    confidence, tags, extracted_text_preview, full_text, cluster_id, classifier_version, tier,
+                    %s
+                FROM {staging}
+                WHERE original_path IS NOT NULL
+                ORDER BY original_path, id DESC
+                ON CONFLICT (original_path) DO UPDATE SET {updates},
+                    export_run = EXCLUDED.export_run, updated_at = now()
+            """, (run_id,))
+            loaded = cur.rowcount
+        self.conn.commit()
+        return loaded
+
+    def _is_empty(self):
+        with self.conn.cursor() as cur:
+            cur.execute(f"SELECT NOT EXISTS (SELECT 1 FROM {self.table})")
+            empty = cur.fetchone()[0]
+        self.conn.commit()
+        return empty
+
+    @staticmethod
+    def _target(name):
+        return "index_id" if name == "id" else name
+
+    def _execute(self, sql):
+        with self.conn.cursor() as cur:
+            cur.execute(sql)
+        self.conn.commit()
@@ -0,0 +1,109 @@
+import logging
+import os
+import stat
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from src.config import (
+    PREFETCH_CONCURRENCY, PREFETCH_MEMORY_BYTES, PREFETCH_MAX_FILE_BYTES,
+    TEXT_HEAD_BYTES, TEXT_TAIL_BYTES
+)
+from src.extractor import TEXT_TYPES, CODE_TYPES, IMAGE_TYPES
+
+logger = logging.getLogger(__name__)
+
+BUFFERED_TYPES = {"pdf"} | IMAGE_TYPES
+
+
+class Prefetcher:
+    """
+    Issues stat() and whole-file reads ahead of the extractors with bounded concurrency
+    and a memory budget, so network-share latency overlaps with extraction work.
+    Yields (file_path, stats, data) in input order; data is None when the file is
+    better read directly (too large, unsupported type, or a text file the extractor
+    only needs a head/tail window of).
+    """
+
+    def __init__(self, concurrency=PREFETCH_CONCURRENCY, memory_budget=PREFETCH_MEMORY_BYTES,
+                 max_file_bytes=PREFETCH_MAX_FILE_BYTES):
+        self.concurrency = concurrency
+        self.memory_budget = memory_budget
+        self.max_file_bytes = max_file_bytes
+        self._in_flight = 0
+        self._head_seq = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def iter(self, files):
+        files = iter(files)
+        window = deque()
+        seq = 0
+        with self._cond:
+            self._in_flight, self._head_seq, self._closed = 0, 0, False
+        pool = ThreadPoolExecutor(max_workers=self.concurrency)
+        try:
+            while True:
+                # Keep a few reads queued per thread
+                while len(window) < self.concurrency * 2:
+                    try:
+                        file_path = next(files)
+                    except StopIteration:
+                        break
+                    window.append(pool.submit(self._fetch, seq, file_path))
+                    seq += 1
+                if not window:
+                    break
+
+                file_path, stats, data = window.popleft().result()
+                with self._cond:
+                    self._head_seq += 1
+                    self._in_flight -= len(data) if data else 0
+                    self._cond.notify_all()
+                yield file_path, stats, data
+        finally:
+            # The consumer stopped early (lost lease, error, Ctrl-C): release reads waiting on the budget
+            with self._cond:
+                self._closed = True
+                self._cond.notify_all()
+            pool.shutdown(cancel_futures=True)
+
+    def _fetch(self, seq, file_path):
+        try:
+            stats = os.stat(file_path)
+        except OSError as e:
+            logger.debug(f"Prefetch stat failed for {file_path}: {e}")
+            return file_path, None, None
+
+        if not self._wants_buffer(Path(file_path), stats):
+            return file_path, stats, None
+
+        size = stats.st_size
+        with self._cond:
+            # The next file the consumer needs may always proceed, so the budget cannot deadlock
+            while self._in_flight + size > self.memory_budget and seq != self._head_seq and not self._closed:
+                self._cond.wait()
+            if self._closed:
+                return file_path, stats, None
+            self._in_flight += size
+
+        try:
+            with open(file_path, 'rb') as f:
+                data = f.read()
+        except OSError as e:
+            logger.debug(f"Prefetch read failed for {file_path}: {e}")
+            data = None
+        with self._cond:
+            self._in_flight -= size - (len(data) if data else 0)
+            self._cond.notify_all()
+        return file_path, stats, data
+
+    def _wants_buffer(self, file_path, stats):
+        if not stat.S_ISREG(stats.st_mode) or stats.st_size > self.max_file_bytes:
+            return False
+        file_type = file_path.suffix.lower().lstrip('.')
+        if file_type in TEXT_TYPES or file_type in CODE_TYPES:
+            # Small text is read whole; large text is two range reads the extractor does itself
+            return stats.st_size <= TEXT_HEAD_BYTES + TEXT_TAIL_BYTES
+        return file_type in BUFFERED_TYPES
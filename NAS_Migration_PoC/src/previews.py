@@ -0,0 +1,249 @@
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from multiprocessing.connection import wait
+from pathlib import Path
+
+from src.config import (
+    PREVIEW_CACHE_DIR, PREVIEW_CACHE_BYTES, PREVIEW_MAX_PX, PREVIEW_WORKERS,
+    PREVIEW_TIMEOUT_SECONDS, PREVIEW_MEMORY_LIMIT_MB, PREVIEW_MEMO_ENTRIES
+)
+from src.extractor import IMAGE_TYPES
+from src.journal import file_hash
+from src.supervisor import Worker, apply_limits
+
+try:
+    import fitz  # PyMuPDF
+except ImportError:
+    fitz = None
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+PREVIEW_TYPES = {"pdf"} | IMAGE_TYPES
+
+
+def render_thumbnail(source, destination, max_px):
+    """Worker: write a JPEG thumbnail of a PDF's first page or of an image."""
+    if Path(source).suffix.lower().lstrip('.') == "pdf":
+        with fitz.open(source) as doc:
+            page = doc[0]
+            zoom = max_px / max(page.rect.width, page.rect.height)
+            pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+            image = Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+    else:
+        image = Image.open(source)
+        image.draft("RGB", (max_px, max_px))  # JPEG decodes straight at a reduced scale
+        image.thumbnail((max_px, max_px))
+        image = image.convert("RGB")
+
+    tmp_path = f"{destination}.{os.getpid()}.tmp"
+    image.save(tmp_path, "JPEG", quality=80, optimize=True)
+    os.replace(tmp_path, destination)
+    return os.path.getsize(destination)
+
+
+def _render_loop(conn, memory_limit_mb):
+    """Child process: render thumbnails sent over the pipe until told to stop."""
+    if hasattr(os, "setsid"):
+        os.setsid()
+    apply_limits(memory_limit_mb)
+
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            break
+        if task is None:
+            break
+
+        key, source, destination, max_px = task
+        try:
+            conn.send((key, render_thumbnail(source, destination, max_px), None))
+        except MemoryError:
+            conn.send((key, None, f"Memory limit exceeded ({memory_limit_mb} MB)"))
+        except Exception as e:
+            conn.send((key, None, f"Render error: {e}"))
+
+
+class PreviewCache:
+    """
+    Thumbnails rendered once per file content and kept in a size-bounded LRU disk cache.
+    Entries are keyed by content hash, so renamed or moved files reuse their thumbnail and
+    edited files get a new one. get() never blocks on rendering: a dispatcher thread feeds
+    supervised worker processes (as in extraction), each render with a deadline and a memory
+    cap. A worker that hangs, crashes or runs out of memory is replaced and its file quarantined.
+    """
+
+    def __init__(self, cache_dir=PREVIEW_CACHE_DIR, max_bytes=PREVIEW_CACHE_BYTES,
+                 max_px=PREVIEW_MAX_PX, workers=PREVIEW_WORKERS,
+                 timeout=PREVIEW_TIMEOUT_SECONDS, memory_limit_mb=PREVIEW_MEMORY_LIMIT_MB,
+                 memo_entries=PREVIEW_MEMO_ENTRIES):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.max_px = max_px
+        self.workers = max(1, workers)
+        self.timeout = timeout
+        self.memory_limit_mb = memory_limit_mb
+        self.memo_entries = memo_entries
+        self._ctx = multiprocessing.get_context("spawn")
+        self._queue = deque()  # (key, source, destination) waiting for a worker
+        self._pending = set()  # Keys queued or rendering
+        self._failed = OrderedDict()  # key -> reason; content-keyed, so an edited file gets another try
+        self._dispatcher = None
+        self._closed = False
+        self._hashes = OrderedDict()  # (path, size, mtime) -> content hash, so unchanged files are hashed once
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+
+        # Renders killed mid-write leave their temporary file behind
+        for tmp_path in self.cache_dir.glob("*.tmp"):
+            tmp_path.unlink(missing_ok=True)
+
+        # Rebuild the LRU order from disk, least recently used first
+        self._entries = OrderedDict()
+        cached = sorted(self.cache_dir.glob("*.jpg"), key=lambda p: p.stat().st_mtime)
+        for path in cached:
+            self._entries[path.stem] = path.stat().st_size
+        self._total = sum(self._entries.values())
+
+    @staticmethod
+    def supports(file_type):
+        if file_type == "pdf":
+            return fitz is not None and Image is not None
+        return file_type in IMAGE_TYPES and Image is not None
+
+    def content_key(self, file_path):
+        """Content hash of the file plus the thumbnail size (doubles as the HTTP ETag)."""
+        st = os.stat(file_path)
+        stat_key = (str(file_path), st.st_size, st.st_mtime_ns)
+        with self._lock:
+            digest = self._hashes.get(stat_key)
+            if digest is not None:
+                self._hashes.move_to_end(stat_key)
+        if digest is None:
+            digest = file_hash(file_path)
+            with self._lock:
+                self._remember(self._hashes, stat_key, digest)
+        return f"{digest}-{self.max_px}"
+
+    def get(self, file_path):
+        """
+        Return (thumbnail path, key) if it is cached, or (None, key) after making sure a
+        render is queued. Raises OSError if the source cannot be read.
+        """
+        key = self.content_key(file_path)
+        path = self.cache_dir / f"{key}.jpg"
+        with self._lock:
+            if key in self._entries and path.exists():
+                self._entries.move_to_end(key)
+                os.utime(path)  # mtime is the LRU order after a restart
+                return path, key
+            if key not in self._pending and key not in self._failed:
+                self._pending.add(key)
+                self._queue.append((key, str(file_path), str(path)))
+                if self._dispatcher is None:
+                    self._dispatcher = threading.Thread(target=self._dispatch, daemon=True)
+                    self._dispatcher.start()
+                self._wakeup.notify()
+        return None, key
+
+    def failed(self, key):
+        """True if rendering this key failed, timed out or crashed its worker (quarantined)."""
+        return key in self._failed
+
+    def _dispatch(self):
+        """Feed idle workers from the queue and enforce each render's deadline."""
+        workers = [Worker(self._ctx, self.memory_limit_mb, target=_render_loop) for _ in range(self.workers)]
+        try:
+            while True:
+                with self._lock:
+                    while not self._closed and not self._queue and not any(w.task for w in workers):
+                        self._wakeup.wait()
+                    if self._closed:
+                        break
+                    for i, worker in enumerate(workers):
+                        if worker.task or not self._queue:
+                            continue
+                        key, source, destination = self._queue.popleft()
+                        try:
+                            worker.assign(key, source, self.timeout, destination, self.max_px)
+                        except (BrokenPipeError, OSError):
+                            worker.kill()
+                            workers[i] = Worker(self._ctx, self.memory_limit_mb, target=_render_loop)
+                            workers[i].assign(key, source, self.timeout, destination, self.max_px)
+
+                busy = [w for w in workers if w.task]
+                if not busy:
+                    continue
+                # Short timeout so renders queued meanwhile reach idle workers promptly
+                next_deadline = min(w.deadline for w in busy)
+                ready = wait([w.conn for w in busy], timeout=min(0.5, max(0, next_deadline - time.monotonic())))
+
+                for i, worker in enumerate(workers):
+                    if not worker.task:
+                        continue
+                    if worker.conn in ready:
+                        try:
+                            key, size, reason = worker.conn.recv()
+                        except (EOFError, OSError):
+                            key, _ = worker.release()
+                            worker.process.join()
+                            reason = f"Worker exited with code {worker.process.exitcode}"
+                            workers[i] = self._respawn(worker)
+                            self._rendered(key, None, reason)
+                            continue
+                        worker.release()
+                        self._rendered(key, size, reason)
+                    elif time.monotonic() >= worker.deadline:
+                        key, _ = worker.release()
+                        workers[i] = self._respawn(worker)
+                        self._rendered(key, None, f"Timed out after {self.timeout}s")
+        finally:
+            for worker in workers:
+                if worker.task:
+                    worker.kill()
+                else:
+                    worker.stop()
+
+    def _respawn(self, worker):
+        worker.kill()
+        return Worker(self._ctx, self.memory_limit_mb, target=_render_loop)
+
+    def _rendered(self, key, size, reason):
+        with self._lock:
+            self._pending.discard(key)
+            if reason:
+                logger.warning(f"Preview render failed for {key}: {reason}")
+                self._remember(self._failed, key, reason)
+                return
+            self._entries[key] = size
+            self._total += size
+            while self._total > self.max_bytes and len(self._entries) > 1:
+                old_key, size = self._entries.popitem(last=False)
+                self._total -= size
+                try:
+                    (self.cache_dir / f"{old_key}.jpg").unlink()
+                except OSError:
+                    pass
+
+    def _remember(self, memo, key, value):
+        """Insert into an LRU-ordered memo, dropping the oldest entries past memo_entries."""
+        memo[key] = value
+        memo.move_to_end(key)
+        while len(memo) > self.memo_entries:
+            memo.popitem(last=False)
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            self._wakeup.notify()
+        if self._dispatcher is not None:
+            self._dispatcher.join()
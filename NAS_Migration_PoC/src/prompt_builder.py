@@ -0,0 +1,172 @@
+import re
+from collections import Counter, OrderedDict
+
+from src.config import (
+    PROMPT_TOKEN_BUDGET, PROMPT_OUTPUT_TOKEN_BUDGET, PROMPT_MAPPING_TOKENS, PROMPT_CHARS_PER_TOKEN,
+    PROMPT_SEQUENCE_MIN
+)
+
+SEQUENCE_RE = re.compile(r"^(?P<prefix>.*?)(?P<num>\d+)(?P<suffix>\D*)$")
+
+
+class PromptBuilder:
+    """
+    Builds a compact file inventory for the organization prompt.
+    Files are grouped by category and current subfolder, numbered runs collapse to one
+    line (IMG_0001..IMG_0450.jpg), and a shared extension is stated once per group.
+    Every shortened name is recorded in `aliases` so AI answers decode to exact filenames;
+    the extension is only dropped from names whose stem is unique in the inventory, so an
+    alias never stands for two different files.
+    """
+
+    def __init__(self, token_budget=PROMPT_TOKEN_BUDGET, chars_per_token=PROMPT_CHARS_PER_TOKEN,
+                 output_budget=PROMPT_OUTPUT_TOKEN_BUDGET):
+        self.token_budget = token_budget
+        self.chars_per_token = chars_per_token
+        self.output_budget = output_budget
+        self.aliases = {}
+
+    def estimate_tokens(self, text):
+        """Cheap local token estimate (no API round-trip)."""
+        return len(text) // self.chars_per_token + 1
+
+    def estimate_answer_tokens(self, line, files):
+        """Tokens the file_mapping answer spends on one inventory line (headers map to nothing)."""
+        return self.estimate_tokens(line) + PROMPT_MAPPING_TOKENS if files else 0
+
+    def build_batches(self, documents, versions=None, overhead_tokens=0, output_overhead_tokens=0):
+        """
+        Split the inventory into prompt-sized batches.
+        Returns a list of (inventory_text, file_count) each fitting within the input budget,
+        with an estimated file_mapping answer that fits within the output budget.
+        """
+        versions = versions or {}
+        budget = self.token_budget - overhead_tokens
+        output_budget = self.output_budget - output_overhead_tokens
+
+        sections = self._sections(documents, versions, with_subfolders=True)
+        if self._tokens(sections) > budget:
+            # Shrink first: drop the per-subfolder headers
+            sections = self._sections(documents, versions, with_subfolders=False)
+
+        batches = []
+        lines, count, answer = [], 0, 0
+        for header, entries in sections:
+            for line, files, line_answer in self._pack(header, entries, budget, output_budget):
+                if lines and (self.estimate_tokens("".join(lines) + line) > budget
+                              or answer + line_answer > output_budget):
+                    batches.append(("".join(lines), count))
+                    lines, count, answer = [], 0, 0
+                lines.append(line)
+                count += files
+                answer += line_answer
+        if lines:
+            batches.append(("".join(lines), count))
+        return batches
+
+    def decode_mapping(self, file_mapping):
+        """Expand range labels and extension-less names back into exact filenames."""
+        decoded = {}
+        for name, path in file_mapping.items():
+            for filename in self.aliases.get(name.lower().strip(), [name]):
+                decoded[filename] = path
+        return decoded
+
+    def _tokens(self, sections):
+        return sum(
+            self.estimate_tokens(header) + sum(self.estimate_tokens(line) for line, _ in entries)
+            for header, entries in sections
+        )
+
+    def _pack(self, header, entries, budget, output_budget):
+        """Yield the section as text blocks, repeating the header if it has to be split."""
+        block, files, answer = header, 0, 0
+        for line, count in entries:
+            line_answer = self.estimate_answer_tokens(line, count)
+            if files and (self.estimate_tokens(block + line) > budget or answer + line_answer > output_budget):
+                yield block, files, answer
+                block, files, answer = header.replace(")\n", ", cont.)\n", 1), 0, 0
+            block += line
+            files += count
+            answer += line_answer
+        yield block, files, answer
+
+    def _sections(self, documents, versions, with_subfolders):
+        self.aliases = {}
+        by_category = OrderedDict()
+        for doc in documents:
+            if doc.get('cluster_id') not in (None, doc.get('id')):
+                continue
+            category = doc.get('category') or 'Uncategorized'
+            subfolder = (doc.get('subfolder') or '') if with_subfolders else ''
+            by_category.setdefault(category, OrderedDict()).setdefault(subfolder, []).append(doc)
+
+        # Stems shared by several files ("report.pdf", "report.docx") keep their extension
+        stems = Counter(self._stem(doc['filename']) for groups in by_category.values()
+                        for docs in groups.values() for doc in docs)
+        ambiguous = {stem for stem, count in stems.items() if count > 1}
+
+        sections = []
+        for category, groups in by_category.items():
+            total = sum(len(docs) for docs in groups.values())
+            entries = []
+            for subfolder, docs in groups.items():
+                extension = self._shared_extension(docs)
+                if subfolder or extension:
+                    label = f"Current: {subfolder}" if subfolder else "Files"
+                    if extension:
+                        label += f", all {extension}"
+                    entries.append((f"### {label}\n", 0))
+                entries.extend(self._lines(docs, versions, extension, ambiguous))
+            sections.append((f"\n## {category} ({total} files)\n", entries))
+        return sections
+
+    def _lines(self, docs, versions, extension, ambiguous=frozenset()):
+        runs = OrderedDict()
+        singles = []
+        for doc in docs:
+            match = SEQUENCE_RE.match(doc['filename'])
+            if match and not versions.get(doc.get('id')):
+                key = (match.group('prefix'), match.group('suffix'))
+                runs.setdefault(key, []).append((int(match.group('num')), match.group('num'), doc['filename']))
+            else:
+                singles.append(doc)
+
+        lines = []
+        for (prefix, suffix), members in runs.items():
+            if len(members) < PROMPT_SEQUENCE_MIN:
+                singles.extend({'filename': name, 'id': None} for _, _, name in members)
+                continue
+            members.sort()
+            label = f"{prefix}{members[0][1]}..{prefix}{members[-1][1]}{suffix}"
+            if extension and not any(self._stem(name) in ambiguous for _, _, name in members):
+                label = label[:-len(extension)]
+            self.aliases.setdefault(label.lower(), []).extend(name for _, _, name in members)
+            lines.append((f"- {label} ({len(members)} files)\n", len(members)))
+
+        for doc in singles:
+            name = doc['filename']
+            if extension and self._stem(name) not in ambiguous:
+                name = name[:-len(extension)]
+                self.aliases.setdefault(name.lower().strip(), []).append(doc['filename'])
+            line = f"- {name}"
+            similar = len(versions.get(doc.get('id'), []))
+            if similar:
+                line += f" [+{similar} similar versions]"
+            lines.append((line + "\n", 1))
+        return lines
+
+    def _shared_extension(self, docs):
+        """The extension every file in the group has in common, if any."""
+        if len(docs) < 2:
+            return ""
+        extensions = {self._extension(doc['filename']) for doc in docs}
+        return extensions.pop() if len(extensions) == 1 else ""
+
+    def _stem(self, filename):
+        """Lowercased filename without its extension, as an alias would be looked up."""
+        return filename[:len(filename) - len(self._extension(filename))].lower().strip()
+
+    def _extension(self, filename):
+        dot = filename.rfind('.')
+        return filename[dot:] if dot > 0 else ""
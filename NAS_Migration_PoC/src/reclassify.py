@@ -0,0 +1,86 @@
+import json
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+from src.classifier import DocumentClassifier
+from src.config import EXTRACT_WORKERS, RECLASSIFY_BATCH_SIZE
+
+logger = logging.getLogger(__name__)
+
+# Index fields the classifier owns, paired with the classification keys they come from
+CLASSIFIED_FIELDS = {
+    "category": "service_category",
+    "subfolder": "subfolder_path",
+    "confidence": "confidence_score",
+}
+
+
+def _classify_batch(batch):
+    """Worker: run the current classifier over (id, text, filename, file_type) tuples."""
+    classifier = DocumentClassifier(use_mock=True)
+    return [
+        (doc_id, classifier.classify(text, {"filename": filename, "file_type": file_type}))
+        for doc_id, text, filename, file_type in batch
+    ]
+
+
+class Reclassifier:
+    """
+    Re-runs DocumentClassifier over the text already stored in the index.
+    Nothing is re-read or re-OCR'd; entries stamped with the current classifier
+    version are skipped, and only changed classifications are written back.
+    """
+
+    def __init__(self, indexer, workers=EXTRACT_WORKERS, batch_size=RECLASSIFY_BATCH_SIZE):
+        self.indexer = indexer
+        self.workers = workers
+        self.batch_size = batch_size
+
+    def run(self, force=False):
+        """Reclassify stale entries. Returns the diff report (one dict per changed entry)."""
+        entries = {entry["id"]: entry for entry in self.indexer.load()}
+        stale = [
+            (entry["id"], entry.get("full_text") or "", entry.get("filename") or "", entry.get("file_type") or "")
+            for entry in entries.values()
+            if force or entry.get("classifier_version") != DocumentClassifier.VERSION
+        ]
+        logger.info(f"{len(stale)} of {len(entries)} entries need classifier {DocumentClassifier.VERSION}")
+        if not stale:
+            return []
+
+        batches = [stale[i:i + self.batch_size] for i in range(0, len(stale), self.batch_size)]
+        report = []
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            for results in pool.map(_classify_batch, batches):
+                for doc_id, classification in results:
+                    change = self._apply(entries[doc_id], classification)
+                    if change:
+                        report.append(change)
+
+        self.indexer.save()
+        logger.info(f"Reclassified {len(stale)} entries, {len(report)} changed")
+        return report
+
+    def _apply(self, entry, classification):
+        before = {field: entry.get(field) for field in CLASSIFIED_FIELDS}
+        after = {field: classification.get(key) for field, key in CLASSIFIED_FIELDS.items()}
+
+        entry["classifier_version"] = classification.get("classifier_version")
+        if before == after:
+            return None
+
+        self.indexer.stats.remove(entry)
+        entry.update(after)
+        self.indexer.stats.add(entry)
+        entry["tags"] = classification.get("reasoning", "").split(". ")
+        return {
+            "id": entry["id"],
+            "filename": entry.get("filename"),
+            "before": before,
+            "after": after,
+        }
+
+    @staticmethod
+    def save_report(report, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
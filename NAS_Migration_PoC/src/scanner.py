@@ -1,10 +1,18 @@
 import os
 from pathlib import Path
 
+# Folders never scanned (our own output, the app itself, tool caches)
+EXCLUDED_DIRS = ("Organized_Personal_Files", "NAS_Migration_PoC", ".gemini", "com.replay.Replay")
+
 class FileScanner:
     def __init__(self, root_path):
         self.root_path = Path(root_path)
 
+    @staticmethod
+    def is_excluded(path):
+        """Exclusion Logic shared with the directory snapshot."""
+        return any(name in str(path) for name in EXCLUDED_DIRS)
+
     def scan(self):
         """Recursively scan for files."""
         if not self.root_path.exists():
@@ -12,7 +20,7 @@ class FileScanner:
 
         for root, dirs, files in os.walk(self.root_path):
             # Exclusion Logic
-            if "Organized_Personal_Files" in root or "NAS_Migration_PoC" in root or ".gemini" in root or "com.replay.Replay" in root:
+            if self.is_excluded(root):
                 continue
                 
             for file in files:
@@ -0,0 +1,106 @@
+import json
+import logging
+import os
+from pathlib import Path
+
+from src.config import SNAPSHOT_PATH
+from src.scanner import FileScanner
+
+logger = logging.getLogger(__name__)
+
+
+class DirectorySnapshot:
+    """
+    Persisted snapshot of the source tree: each directory stores its mtime, its
+    subdirectories and its files' (size, mtime).
+    A directory whose mtime is unchanged has had nothing added, removed or renamed, so a
+    reconciliation without check_files costs one stat() per directory and reuses its listing.
+    In-place edits only show up in the file's own mtime, so check_files=True re-lists every
+    directory (one stat per file) to report them too.
+    """
+
+    def __init__(self, root, path=SNAPSHOT_PATH):
+        self.root = Path(root)
+        self.path = Path(path)
+        self.dirs = {}
+
+    def load(self):
+        """Load the previous snapshot. Returns False if there is none (or it is for another root)."""
+        if not self.path.exists():
+            return False
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"Ignoring unreadable snapshot {self.path}: {e}")
+            return False
+        if data.get("root") != str(self.root):
+            return False
+        self.dirs = data.get("dirs", {})
+        return True
+
+    def save(self):
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"root": str(self.root), "dirs": self.dirs}, f)
+        os.replace(tmp_path, self.path)
+
+    def reconcile(self, check_files=False):
+        """
+        Compare the live tree with the snapshot, update the snapshot in memory and return
+        {"added": [...], "deleted": [...], "modified": [...]} as absolute paths.
+        check_files=True also re-stats files in unchanged directories, catching in-place
+        edits that do not touch the directory mtime (editors that save via rename do).
+        """
+        changes = {"added": [], "deleted": [], "modified": []}
+        new_dirs = {}
+        self._visit(".", new_dirs, changes, check_files)
+
+        # Directories that disappeared take all their files with them
+        for rel in self.dirs.keys() - new_dirs.keys():
+            changes["deleted"].extend(str(self.root / rel / name) for name in self.dirs[rel]["files"])
+
+        self.dirs = new_dirs
+        return changes
+
+    def _visit(self, rel, new_dirs, changes, check_files):
+        full = self.root / rel
+        try:
+            mtime = os.stat(full).st_mtime_ns
+        except OSError:
+            return
+        prev = self.dirs.get(rel)
+
+        if prev and prev["mtime"] == mtime and not check_files:
+            files, subdirs = prev["files"], prev["subdirs"]
+        else:
+            files, subdirs = self._list(full)
+            old_files = prev["files"] if prev else {}
+            changes["added"].extend(str(full / n) for n in files.keys() - old_files.keys())
+            changes["deleted"].extend(str(full / n) for n in old_files.keys() - files.keys())
+            changes["modified"].extend(
+                str(full / n) for n in files.keys() & old_files.keys() if files[n] != old_files[n]
+            )
+
+        new_dirs[rel] = {"mtime": mtime, "files": files, "subdirs": subdirs}
+        for name in subdirs:
+            self._visit(os.path.normpath(os.path.join(rel, name)), new_dirs, changes, check_files)
+
+    def _list(self, full):
+        files, subdirs = {}, []
+        try:
+            with os.scandir(full) as it:
+                for entry in it:
+                    try:
+                        # Same rules as FileScanner.scan: hidden directories are walked, hidden files skipped
+                        if entry.is_dir(follow_symlinks=False):
+                            if not FileScanner.is_excluded(entry.path):
+                                subdirs.append(entry.name)
+                        elif entry.is_file(follow_symlinks=False) and not entry.name.startswith('.'):
+                            st = entry.stat(follow_symlinks=False)
+                            files[entry.name] = [st.st_size, st.st_mtime_ns]
+                    except OSError:
+                        continue
+        except OSError as e:
+            logger.warning(f"Could not list {full}: {e}")
+        return files, sorted(subdirs)
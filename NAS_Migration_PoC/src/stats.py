@@ -0,0 +1,107 @@
+import json
+import os
+import time
+from collections import Counter
+from pathlib import Path
+
+from src.config import CONFIDENCE_THRESHOLD_AUTO_FILE, CONFIDENCE_THRESHOLD_REVIEW
+
+
+def confidence_band(confidence):
+    if confidence is None:
+        return "unknown"
+    if confidence >= CONFIDENCE_THRESHOLD_AUTO_FILE:
+        return "auto_file"
+    if confidence >= CONFIDENCE_THRESHOLD_REVIEW:
+        return "likely"
+    return "review"
+
+
+class IndexStats:
+    """
+    Facet counts and histograms over the index, kept up to date one entry at a time.
+    Every index mutation calls add()/remove(), so reading the aggregates never scans documents.
+    """
+
+    def __init__(self):
+        self.total = 0
+        self.total_bytes = 0
+        self.review_needed = 0
+        self.categories = Counter()
+        self.subfolders = Counter()  # "Category/sub/path" prefixes -> files at or below
+        self.file_types = Counter()
+        self.confidence_bands = Counter()
+        self.size_histogram = Counter()  # log2 bucket -> files
+        self.date_histogram = Counter()  # "YYYY-MM" of the file mtime -> files
+        self.tiers = Counter()
+
+    def add(self, entry):
+        self._apply(entry, 1)
+
+    def remove(self, entry):
+        self._apply(entry, -1)
+
+    def _apply(self, entry, sign):
+        category = entry.get("category") or "Uncategorized"
+        confidence = entry.get("confidence")
+        size = entry.get("file_size") or 0
+
+        self.total += sign
+        self.total_bytes += sign * size
+        if confidence is not None and confidence < CONFIDENCE_THRESHOLD_REVIEW:
+            self.review_needed += sign
+        self._count(self.categories, category, sign)
+        self._count(self.file_types, entry.get("file_type") or "", sign)
+        self._count(self.confidence_bands, confidence_band(confidence), sign)
+        self._count(self.size_histogram, size.bit_length(), sign)
+        self._count(self.tiers, entry.get("tier", 2), sign)
+        if entry.get("file_date") is not None:
+            self._count(self.date_histogram, time.strftime("%Y-%m", time.localtime(entry["file_date"])), sign)
+
+        prefix = category
+        self._count(self.subfolders, prefix, sign)
+        for part in (entry.get("subfolder") or "").strip("/").split("/"):
+            if part:
+                prefix = f"{prefix}/{part}"
+                self._count(self.subfolders, prefix, sign)
+
+    @staticmethod
+    def _count(counter, key, sign):
+        counter[key] += sign
+        if counter[key] <= 0:
+            del counter[key]
+
+    def to_dict(self):
+        return {
+            "total": self.total,
+            "total_bytes": self.total_bytes,
+            "review_needed": self.review_needed,
+            "categories": dict(self.categories),
+            "subfolder_tree": self._tree(),
+            "file_types": dict(self.file_types.most_common()),
+            "confidence_bands": dict(self.confidence_bands),
+            # Bucket n holds sizes in [2^(n-1), 2^n); bucket 0 is empty files
+            "size_histogram": [
+                {"min_bytes": (1 << (b - 1)) if b else 0, "count": self.size_histogram[b]}
+                for b in sorted(self.size_histogram)
+            ],
+            "date_histogram": dict(sorted(self.date_histogram.items())),
+            "tiers": {str(tier): count for tier, count in self.tiers.items()},
+        }
+
+    def _tree(self):
+        tree = {}
+        for path in sorted(self.subfolders):
+            node = tree
+            parts = path.split("/")
+            for part in parts[:-1]:
+                node = node[part]["children"]
+            node[parts[-1]] = {"count": self.subfolders[path], "children": {}}
+        return tree
+
+    def save(self, path):
+        path = Path(path)
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, indent=2)
+        os.replace(tmp_path, path)
@@ -0,0 +1,214 @@
+import logging
+import multiprocessing
+import os
+import signal
+import sys
+import time
+from multiprocessing.connection import wait
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from src.config import EXTRACT_WORKERS, EXTRACT_TIMEOUT_SECONDS, EXTRACT_MEMORY_LIMIT_MB
+from src.extractor import ContentExtractor
+from src.near_duplicates import NearDuplicateDetector
+
+logger = logging.getLogger(__name__)
+
+
+def apply_limits(memory_limit_mb):
+    """Cap the address space of the current process (Linux only)."""
+    if resource and memory_limit_mb and sys.platform.startswith("linux"):
+        limit = int(memory_limit_mb) * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def _worker_loop(conn, memory_limit_mb):
+    """Child process: extract files sent over the pipe (and MinHash their text) until told to stop."""
+    # Own process group so a kill also takes down helpers like the tesseract binary
+    if hasattr(os, "setsid"):
+        os.setsid()
+    apply_limits(memory_limit_mb)
+    extractor = ContentExtractor()
+    duplicates = NearDuplicateDetector()
+
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            break
+        if task is None:
+            break
+
+        task_id, file_path, stats, data = task
+        try:
+            text, metadata = extractor.extract(file_path, data=data, stats=stats)
+            conn.send((task_id, text, metadata, duplicates.signature(text), None))
+        except MemoryError:
+            conn.send((task_id, None, None, None, f"Memory limit exceeded ({memory_limit_mb} MB)"))
+        except Exception as e:
+            conn.send((task_id, None, None, None, f"Worker error: {e}"))
+
+
+class Worker:
+    """One supervised child; `target` is its receive loop (extraction unless given)."""
+
+    def __init__(self, ctx, memory_limit_mb, target=None):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=target or _worker_loop, args=(child_conn, memory_limit_mb), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.task = None
+        self.deadline = None
+
+    def assign(self, task_id, file_path, timeout, *args):
+        self.conn.send((task_id, str(file_path), *args))
+        self.task = (task_id, file_path)
+        self.deadline = time.monotonic() + timeout
+
+    def release(self):
+        task = self.task
+        self.task = None
+        self.deadline = None
+        return task
+
+    def kill(self):
+        try:
+            if hasattr(os, "killpg"):
+                os.killpg(self.process.pid, signal.SIGKILL)
+            else:
+                self.process.kill()
+        except (ProcessLookupError, PermissionError):
+            # Still starting up: no process group of its own yet (setsid not called)
+            self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.kill()
+        else:
+            self.conn.close()
+
+
+class SupervisedExtractor:
+    """
+    Runs ContentExtractor in a pool of supervised child processes.
+    Each file gets a wall-clock deadline and each worker a memory cap; a worker
+    that overruns is killed, its file quarantined, and a fresh worker takes its place.
+    """
+
+    def __init__(self, workers=EXTRACT_WORKERS, timeout=EXTRACT_TIMEOUT_SECONDS,
+                 memory_limit_mb=EXTRACT_MEMORY_LIMIT_MB):
+        self.num_workers = max(1, workers)
+        self.timeout = timeout
+        self.memory_limit_mb = memory_limit_mb
+        self._ctx = multiprocessing.get_context("spawn")
+        self._workers = []
+
+    def __enter__(self):
+        self._workers = [self._spawn() for _ in range(self.num_workers)]
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        for worker in self._workers:
+            if worker.task:
+                worker.kill()
+            else:
+                worker.stop()
+        self._workers = []
+
+    def _spawn(self):
+        return Worker(self._ctx, self.memory_limit_mb)
+
+    def _replace(self, worker):
+        worker.kill()
+        fresh = self._spawn()
+        self._workers[self._workers.index(worker)] = fresh
+        return fresh
+
+    def imap(self, files, prefetcher=None):
+        """
+        Extract files in parallel.
+        Yields (file_path, text, metadata, signature, quarantine_reason) in completion order;
+        signature is the text's MinHash (None if too short), and text/metadata/signature
+        are None and quarantine_reason is set for quarantined files.
+        With a Prefetcher, workers get in-memory buffers instead of touching the share.
+        """
+        if not self._workers:
+            self._workers = [self._spawn() for _ in range(self.num_workers)]
+        self._abandon_tasks()
+
+        items = prefetcher.iter(files) if prefetcher else ((f, None, None) for f in files)
+        pending = iter(enumerate(items))
+        exhausted = False
+
+        try:
+            while True:
+                # Keep every idle worker fed
+                for worker in list(self._workers):
+                    if exhausted or worker.task:
+                        continue
+                    try:
+                        task_id, (file_path, stats, data) = next(pending)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    try:
+                        worker.assign(task_id, file_path, self.timeout, stats, data)
+                    except (BrokenPipeError, OSError):
+                        self._replace(worker).assign(task_id, file_path, self.timeout, stats, data)
+
+                busy = [w for w in self._workers if w.task]
+                if not busy:
+                    break
+
+                next_deadline = min(w.deadline for w in busy)
+                ready = wait([w.conn for w in busy], timeout=max(0, next_deadline - time.monotonic()))
+
+                for worker in busy:
+                    if worker.conn in ready:
+                        try:
+                            task_id, text, metadata, signature, reason = worker.conn.recv()
+                        except (EOFError, OSError):
+                            _, file_path = worker.release()
+                            worker.process.join()
+                            reason = f"Worker exited with code {worker.process.exitcode}"
+                            logger.warning(f"Quarantined {file_path}: {reason}")
+                            self._replace(worker)
+                            yield file_path, None, None, None, reason
+                            continue
+
+                        _, file_path = worker.release()
+                        if reason:
+                            logger.warning(f"Quarantined {file_path}: {reason}")
+                        yield file_path, text, metadata, signature, reason
+
+                    elif time.monotonic() >= worker.deadline:
+                        _, file_path = worker.release()
+                        reason = f"Timed out after {self.timeout}s"
+                        logger.warning(f"Quarantined {file_path}: {reason}")
+                        self._replace(worker)
+                        yield file_path, None, None, None, reason
+        finally:
+            # Stopped early (lost lease, consumer error): results still in flight belong to this call only
+            self._abandon_tasks()
+            if hasattr(items, "close"):
+                items.close()
+
+    def _abandon_tasks(self):
+        """Replace workers still busy with a task from an earlier, abandoned imap() call."""
+        for worker in list(self._workers):
+            if worker.task:
+                worker.release()
+                self._replace(worker)
@@ -0,0 +1,101 @@
+"""
+Round trip of the PostgreSQL export against a real server. Skipped unless NAS_PG_DSN is set:
+
+    NAS_PG_DSN="dbname=nas_test" python -m unittest discover -s tests
+"""
+import os
+import sys
+import unittest
+from pathlib import Path
+
+# Add parent dir to sys.path to import from src
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from src.pg_export import PostgresExporter, psycopg2
+
+DSN = os.environ.get("NAS_PG_DSN")
+
+
+def entry(doc_id, name, text, category="Financial"):
+    return {
+        "id": doc_id,
+        "filename": name,
+        "original_path": f"/share/docs/{name}",
+        "file_type": "txt",
+        "file_size": len(text),
+        "file_date": 1700000000.5,
+        "category": category,
+        "subfolder": f"{category}/Misc",
+        "confidence": 70,
+        "tags": ["Matched invoice", "Keyword heuristic"],
+        "extracted_text_preview": text[:200],
+        "full_text": text,
+        "cluster_id": doc_id,
+        "classifier_version": "heuristic-2",
+        "tier": 2,
+    }
+
+
+@unittest.skipUnless(DSN and psycopg2, "needs NAS_PG_DSN and psycopg2")
+class PostgresExportTest(unittest.TestCase):
+    table = f"nas_export_test_{os.getpid()}"
+
+    def setUp(self):
+        self.conn = psycopg2.connect(DSN)
+
+    def tearDown(self):
+        with self.conn.cursor() as cur:
+            cur.execute(f"DROP TABLE IF EXISTS {self.table}")
+        self.conn.commit()
+        self.conn.close()
+
+    def query(self, sql, params=()):
+        with self.conn.cursor() as cur:
+            cur.execute(sql.format(table=self.table), params)
+            rows = cur.fetchall()
+        self.conn.commit()
+        return rows
+
+    def search(self, term):
+        return [row[0] for row in self.query(
+            "SELECT filename FROM {table} WHERE to_tsvector('english', coalesce(filename, '') || ' ' || "
+            "coalesce(full_text, '')) @@ plainto_tsquery('english', %s) ORDER BY filename", (term,)
+        )]
+
+    def test_load_upsert_and_prune(self):
+        first = [
+            entry(1, "invoice_march.txt", "Invoice for March\twith a tab, a\nnewline and a \\ backslash"),
+            entry(2, "resume.txt", "Resume: ten years of Python experience", "Career"),
+            entry(3, "old_notes.txt", "Meeting notes nobody needs"),
+        ]
+        loaded = PostgresExporter(DSN, table=self.table, batch_rows=2).export(first)
+        self.assertEqual(loaded, 3)
+        self.assertEqual(self.query("SELECT count(*) FROM {table}"), [(3,)])
+        self.assertEqual(self.search("invoice"), ["invoice_march.txt"])
+        # COPY escaping round-trips control characters and JSON
+        self.assertEqual(
+            self.query("SELECT full_text, tags FROM {table} WHERE filename = 'invoice_march.txt'"),
+            [(first[0]["full_text"], first[0]["tags"])],
+        )
+
+        # Re-scan: one file reclassified, one gone, one new
+        second = [
+            entry(1, "invoice_march.txt", first[0]["full_text"], "Tax"),
+            entry(2, "resume.txt", first[1]["full_text"], "Career"),
+            entry(3, "tax_return.txt", "Tax return and payment invoice"),
+        ]
+        loaded = PostgresExporter(DSN, table=self.table, batch_rows=2).export(second, prune=True)
+        self.assertEqual(loaded, 3)
+        self.assertEqual(self.query("SELECT count(*) FROM {table}"), [(3,)])
+        self.assertEqual(
+            self.query("SELECT category FROM {table} WHERE filename = 'invoice_march.txt'"), [("Tax",)]
+        )
+        self.assertEqual(self.search("invoice"), ["invoice_march.txt", "tax_return.txt"])
+        self.assertEqual(self.search("meeting"), [])
+        self.assertEqual(
+            self.query("SELECT indexname FROM pg_indexes WHERE tablename = %s ORDER BY indexname", (self.table,)),
+            [(f"{self.table}_category",), (f"{self.table}_pkey",), (f"{self.table}_search",)],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
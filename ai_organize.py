@@ -12,7 +12,6 @@ import os
 import sys
 from pathlib import Path
 from typing import Dict, List
-import shutil
 
 # Import the new Google GenAI SDK
 from google import genai
@@ -27,10 +26,20 @@ if (BASE_DIR / "NAS_Migration_PoC").exists():
 
 try:
     from src.organizer import FileOrganizer
+    from src.prompt_builder import PromptBuilder
+    from src.move_plan import MovePlanner, MoveExecutor
+    from src.journal import MoveJournal
+    from src.embeddings import SimilarityIndex
+    from src.config import MOVE_WORKERS
 except ImportError:
     # Fallback if src is not found directly
     try:
         from NAS_Migration_PoC.src.organizer import FileOrganizer
+        from NAS_Migration_PoC.src.prompt_builder import PromptBuilder
+        from NAS_Migration_PoC.src.move_plan import MovePlanner, MoveExecutor
+        from NAS_Migration_PoC.src.journal import MoveJournal
+        from NAS_Migration_PoC.src.embeddings import SimilarityIndex
+        from NAS_Migration_PoC.src.config import MOVE_WORKERS
     except ImportError:
         print("Error: Could not import FileOrganizer. Please ensure 'src' module is in python path.")
         sys.exit(1)
@@ -42,6 +51,7 @@ class AIOrganizer:
         self.client = genai.Client(api_key=api_key)
         # User explicitly requested gemini-2.5-flash
         self.model_name = "gemini-2.5-flash"
+        self.journal = MoveJournal()
 
     def load_index(self) -> List[Dict]:
         """Load the extracted file data."""
@@ -51,40 +61,68 @@ class AIOrganizer:
             return json.load(f)
     
     def prepare_summary_for_ai(self, documents: List[Dict]) -> str:
-        """Create a concise summary of files for AI analysis."""
-        summary = "# File Inventory for Organization\n\n"
-        
-        # Group by current category to give context
-        by_category = {}
+        """Create a concise summary of files for AI analysis (whole inventory, unsplit)."""
+        builder = PromptBuilder(token_budget=float('inf'), output_budget=float('inf'))
+        batches = builder.build_batches(documents, self.cluster_versions(documents))
+        return "# File Inventory for Organization\n\n" + "".join(text for text, _ in batches)
+    
+    def cluster_versions(self, documents: List[Dict]) -> Dict[int, List[Dict]]:
+        """Map each near-duplicate cluster representative id to its other members."""
+        versions = {}
         for doc in documents:
-            cat = doc.get('category', 'Uncategorized')
-            if cat not in by_category:
-                by_category[cat] = []
-            by_category[cat].append({
-                'filename': doc['filename'],
-                'subfolder': doc.get('subfolder', ''),
-            })
-        
-        for category, files in by_category.items():
-            summary += f"\n## {category} ({len(files)} files)\n"
-            for file in files:
-                summary += f"- {file['filename']}"
-                if file['subfolder']:
-                    summary += f" (Current: {file['subfolder']})"
-                summary += "\n"
+            cluster_id = doc.get('cluster_id')
+            if cluster_id is not None and cluster_id != doc.get('id'):
+                versions.setdefault(cluster_id, []).append(doc)
+        return versions
+    
+    def expand_cluster_mapping(self, file_mapping: Dict, documents: List[Dict]) -> Dict:
+        """Send every near-duplicate version to the folder chosen for its representative."""
+        versions = self.cluster_versions(documents)
+        if not versions:
+            return file_mapping
         
-        return summary
+        expanded = dict(file_mapping)
+        mapped = {name.lower().strip() for name in file_mapping}
+        by_name = {d['filename'].lower().strip(): d for d in documents}
+        for filename, suggested_path in file_mapping.items():
+            doc = by_name.get(filename.lower().strip())
+            if not doc:
+                continue
+            for member in versions.get(doc.get('id'), []):
+                if member['filename'].lower().strip() not in mapped:
+                    expanded[member['filename']] = suggested_path
+        return expanded
     
-    def get_ai_suggestions(self, documents: List[Dict]) -> Dict:
-        """Ask Gemini AI to suggest optimal folder organization."""
-        summary = self.prepare_summary_for_ai(documents)
+    def related_groups(self, documents: List[Dict]) -> List[List[str]]:
+        """Filenames of listed files with similar content, from the local similarity index."""
+        index = SimilarityIndex()
+        if not index.exists():
+            return []
+        index.load()
+        if not index.matches(documents):
+            print("   ⚠️ Similarity index was built from another index, skipping related-file hints (run main.py embed)")
+            return []
+        by_id = {d['id']: d['filename'] for d in documents if d.get('cluster_id') in (None, d.get('id'))}
+        return [[by_id[doc_id] for doc_id in group] for group in index.related_groups(by_id)]
+    
+    def build_prompt(self, inventory: str, file_count: int, known_folders: str = "", related: str = "") -> str:
+        """Wrap one inventory batch in the organization instructions."""
+        folders_hint = ""
+        if known_folders:
+            folders_hint = f"\nFolders already chosen for other files (reuse where they fit): {known_folders}\n"
+        if related:
+            folders_hint += f"\nFiles with related content despite different names (group them where sensible): {related}\n"
         
-        prompt = f"""You are an expert file organization assistant. Analyze this file inventory and suggest an optimal folder structure.
+        return f"""You are an expert file organization assistant. Analyze this file inventory and suggest an optimal folder structure.
 
-{summary}
-
-Total files to organize: {len(documents)}
+# File Inventory for Organization
+{inventory}
 
+Total files to organize: {file_count}
+Files marked "[+N similar versions]" stand for a group of near-identical files; map only the listed filename.
+Lines like "IMG_0001..IMG_0450.jpg (N files)" stand for a numbered run; map the whole line as one key.
+Under a heading with "all .ext", names are listed without that extension; use them exactly as listed.
+{folders_hint}
 Create a smart, hierarchical folder structure (max 3 levels) that makes sense for these files.
 Identify clusters of related files (e.g. "Tax Documents", "Resumes", "School Projects", "Invoices").
 
@@ -102,7 +140,66 @@ IMPORTANT: Respond ONLY with valid JSON in this exact format:
   "summary": "Brief explanation"
 }}
 """
+    
+    def get_ai_suggestions(self, documents: List[Dict]) -> Dict:
+        """Ask Gemini AI to suggest optimal folder organization, one call per budget-sized batch."""
+        builder = PromptBuilder()
+        # Reserve room for the fixed instructions, the running folder hint and the related-files hint
+        hint_budget = builder.token_budget // 10
+        overhead = builder.estimate_tokens(self.build_prompt("", 0)) + 2 * hint_budget
+        # ... and room in the answer for folder_structure and the summary next to file_mapping
+        batches = builder.build_batches(documents, self.cluster_versions(documents), overhead,
+                                        output_overhead_tokens=builder.output_budget // 10)
+        groups = self.related_groups(documents)
+        
+        suggestions = {"folder_structure": {}, "file_mapping": {}, "summary": ""}
+        summaries = []
+        failed = []
+        for i, (inventory, file_count) in enumerate(batches, 1):
+            known_folders = ", ".join(self._folder_paths(suggestions["folder_structure"]))
+            known_folders = known_folders[:hint_budget * builder.chars_per_token]
+            related = "; ".join(
+                " + ".join(group) for group in groups
+                if any(Path(name).stem in inventory for name in group)
+            )[:hint_budget * builder.chars_per_token]
+            prompt = self.build_prompt(inventory, file_count, known_folders, related)
+            if len(batches) > 1:
+                print(f"   Batch {i}/{len(batches)}: {file_count} entries, ~{builder.estimate_tokens(prompt)} tokens")
+            
+            try:
+                result = self._generate(prompt)
+            except Exception as e:
+                # Keep the batches already merged; the files in this one simply stay unmapped
+                print(f"   ⚠️ Batch {i}/{len(batches)} failed ({file_count} entries skipped): {e}")
+                failed.append(i)
+                continue
+            for folder, subfolders in result.get('folder_structure', {}).items():
+                if isinstance(subfolders, dict):
+                    suggestions["folder_structure"].setdefault(folder, {}).update(subfolders)
+                else:
+                    suggestions["folder_structure"].setdefault(folder, subfolders)
+            suggestions["file_mapping"].update(result.get('file_mapping', {}))
+            if result.get('summary'):
+                summaries.append(result['summary'])
         
+        # Expand range labels / shortened names back into exact filenames
+        suggestions["file_mapping"] = builder.decode_mapping(suggestions["file_mapping"])
+        if failed:
+            summaries.append(f"Batches {', '.join(map(str, failed))} of {len(batches)} failed; their files were not mapped.")
+        suggestions["summary"] = "\n".join(summaries)
+        return suggestions
+    
+    def _folder_paths(self, folder_structure: Dict) -> List[str]:
+        paths = []
+        for folder, subfolders in folder_structure.items():
+            if isinstance(subfolders, dict) and subfolders:
+                paths.extend(f"{folder}/{sub}" for sub in subfolders)
+            else:
+                paths.append(folder)
+        return paths
+    
+    def _generate(self, prompt: str) -> Dict:
+        """Single Gemini call returning parsed JSON."""
         try:
             response = self.client.models.generate_content(
                 model=self.model_name,
@@ -127,120 +224,67 @@ IMPORTANT: Respond ONLY with valid JSON in this exact format:
                 text = text.replace("```json", "").replace("```", "")
             return json.loads(text)
 
-    def apply_organization(self, suggestions: Dict, destination_root: Path):
-        """Apply AI's suggested organization."""
-        destination_root.mkdir(parents=True, exist_ok=True)
-        
-        file_mapping = suggestions.get('file_mapping', {})
-        docs = self.load_index()
-        # Create normalized map: lowercase -> doc
-        doc_map = {d['filename'].lower().strip(): d for d in docs}
+    def apply_organization(self, suggestions: Dict, destination_root: Path,
+                           documents: List[Dict] = None, dry_run: bool = False,
+                           workers: int = MOVE_WORKERS):
+        """Apply AI's suggested organization: plan every move first, then execute in parallel."""
+        # Reuse the caller's documents instead of re-reading the index
+        docs = documents if documents is not None else self.load_index()
+        file_mapping = self.expand_cluster_mapping(suggestions.get('file_mapping', {}), docs)
         
-        # DEBUG: Save AI response
+        # Save AI response for inspection
         with open("ai_response.json", "w") as f:
             json.dump(suggestions, f, indent=2)
-            
-        print(f"DEBUG: Index contains {len(docs)} files.")
-        print(f"DEBUG: AI suggested moving {len(file_mapping)} files.")
         
-        # DEBUG: Print first 5 mapping keys to see what AI returned
-        first_keys = list(file_mapping.keys())[:5]
-        print(f"DEBUG: First 5 AI keys: {first_keys}")
+        plan = MovePlanner(destination_root).build(file_mapping, docs)
+        print(f"   Plan: {plan.summary()}")
+        for filename in plan.unmatched[:10]:
+            print(f"⚠️  No match for: '{filename}'")
+        for filename in plan.missing[:10]:
+            print(f"⚠️  Source file missing: {filename}")
         
-        organized_count = 0
-        from difflib import get_close_matches
+        if dry_run:
+            plan.save("organization_plan.json")
+            for move in plan.moves:
+                print(f"   {move['action']:<5} {move['source']} -> {move['destination']}")
+            print("   Dry run: plan written to organization_plan.json, nothing moved.")
+            return 0
         
-        for i, (filename, suggested_path) in enumerate(file_mapping.items()):
-            key = filename.lower().strip()
-            
-            # Debug first one detailedly
-            if i == 0:
-                print(f"DEBUGGING MATCH for: '{filename}' (key: '{key}')")
-                if key in doc_map:
-                    print("   -> Exact string match found in doc_map keys.")
-                else:
-                    print("   -> No exact string match.")
-            
-            # 1. Exact Normal Match
-            doc = doc_map.get(key)
-            
-            # 2. URL Decode Match (if needed)
-            if not doc:
-                import urllib.parse
-                decoded = urllib.parse.unquote(key)
-                doc = doc_map.get(decoded)
-            
-            # 3. Fuzzy Match
-            if not doc:
-                matches = get_close_matches(key, doc_map.keys(), n=1, cutoff=0.8)
-                if matches:
-                    doc = doc_map[matches[0]]
-                    print(f"   (Fuzzy matched '{filename}' to '{matches[0]}')")
-            
-            if doc:
-                source = None
-                if 'original_file_path' in doc:
-                    source = Path(doc['original_file_path'])
-                
-                # Fallback to Downloads if path is missing or doesn't exist
-                if not source or not source.exists():
-                     alt_source = Path("/Users/ashoks/Downloads") / filename
-                     if alt_source.exists():
-                         source = alt_source
-                     else:
-                         # Try unnormalized filename from doc if available
-                         raw_name = doc.get('filename')
-                         if raw_name:
-                             alt_source_2 = Path("/Users/ashoks/Downloads") / raw_name
-                             if alt_source_2.exists():
-                                 source = alt_source_2
-                
-                if not source or not source.exists():
-                    print(f"⚠️  Source file missing: {filename} (checked path and Downloads)")
-                    continue
-                    
-                dest_folder = destination_root / suggested_path
-                dest_folder.mkdir(parents=True, exist_ok=True)
-                dest_file = dest_folder / filename
-                
-                try:
-                    # Check if destination already exists to avoid overwriting or redundant copy
-                    if dest_file.exists():
-                        # Verify size match before assuming it's the same
-                        if dest_file.stat().st_size == source.stat().st_size:
-                            print(f"✓ Skipped (exists): {filename}")
-                            # Track for cleanup
-                            if source.exists():
-                                self.cleanup_source(source)
-                            organized_count += 1
-                            continue
-                            
-                    shutil.copy2(source, dest_file)
-                    organized_count += 1
-                    print(f"✓ Copied: {filename}")
-                    
-                    # Cleanup source after successful copy
-                    self.cleanup_source(source)
-                    
-                except Exception as e:
-                    print(f"✗ Failed move {filename}: {e}")
-            else:
-                 print(f"⚠️  No match for: '{filename}'")
-        
-        return organized_count
+        executor = MoveExecutor(workers=workers, cleanup=self.cleanup_source, journal=self.journal)
+        count = executor.run(plan)
+        print(f"   Journaled as run {executor.run_id} (undo with: python ai_organize.py --undo {executor.run_id})")
+        return count
     
-    def cleanup_source(self, source_path: Path):
+    @staticmethod
+    def cleanup_source(source_path: Path):
         """Safely remove the source file."""
         try:
             # specialized safety check for Downloads
             if "Downloads" in str(source_path) and source_path.exists():
                 os.remove(source_path)
-                print(f"   🗑️  Removed original: {source_path.name}")
         except Exception as e:
             print(f"   ⚠️ Could not remove source: {e}")
 
 
 if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="AI-powered file organization")
+    parser.add_argument("--dry-run", action="store_true", help="Print and save the move plan without touching files")
+    parser.add_argument("--workers", type=int, default=MOVE_WORKERS, help="Parallel copy workers")
+    parser.add_argument("--undo", nargs="?", const="latest", metavar="RUN_ID", help="Undo an organization run (default: latest)")
+    args = parser.parse_args()
+    
+    # Finish or roll back anything a crashed run left half-done (cost ~ journal size, not tree size)
+    journal = MoveJournal()
+    finished, rolled_back = journal.recover(cleanup=AIOrganizer.cleanup_source)
+    if finished or rolled_back:
+        print(f"♻️  Recovered interrupted run: {finished} moves finished, {rolled_back} rolled back")
+    
+    if args.undo:
+        restored = journal.undo(None if args.undo == "latest" else args.undo)
+        print(f"↩️  Restored {restored} files to their original location")
+        sys.exit(0)
+    
     # Configure paths
     BASE_DIR = Path(__file__).resolve().parent
     
@@ -305,7 +349,10 @@ if __name__ == "__main__":
         print("=" * 60)
         
         print(f"\n📦 Applying organization to {DEST_DIR}...")
-        count = organizer.apply_organization(suggestions, DEST_DIR)
+        count = organizer.apply_organization(suggestions, DEST_DIR, documents=documents,
+                                             dry_run=args.dry_run, workers=args.workers)
+        if args.dry_run:
+            sys.exit(0)
         
         print(f"\n✅ Successfully organized {count} files!")
         print(f"   Check your files at: {DEST_DIR}")